@@ -1,7 +1,13 @@
+import argparse
 import socket
 
+parser = argparse.ArgumentParser(description="Interactive TCP client")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=12345)
+args = parser.parse_args()
+
 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.connect(('172.18.110.126',12345))
+    s.connect((args.host, args.port))
     print("Connected to server.")
 
     while True:
@@ -10,10 +16,10 @@ with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
 
         if message.lower() == 'exit':
             print("Connection closed by client.")
-            break   
+            break
         data = s.recv(1024).decode()
         print(f"Server: {data}")
 
         if data.lower() == 'exit':
             print("Connection closed by server.")
-            break
\ No newline at end of file
+            break
@@ -0,0 +1,46 @@
+import struct
+
+# Every frame is a uint32 payload length, a uint32 request id and the payload.
+# The server answers each request frame with a frame carrying the same id, so
+# a client can have many requests in flight on one connection.
+FRAME = struct.Struct('!II')
+MAX_PAYLOAD = 16 << 20
+MAX_REQUEST_ID = 1 << 32
+
+
+class FramingError(Exception):
+    pass
+
+
+def encode_frame(request_id, payload):
+    if len(payload) > MAX_PAYLOAD:
+        raise FramingError(f"payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    return FRAME.pack(len(payload), request_id) + payload
+
+
+class FrameDecoder:
+    """Reassembles frames from arbitrary chunks of a byte stream."""
+
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        self.buffer = bytearray()
+        self.max_payload = max_payload
+
+    def feed(self, data):
+        """Append data and return a list of the (request_id, payload) frames now complete."""
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        offset = 0
+        end = len(buffer)
+        while end - offset >= FRAME.size:
+            length, request_id = FRAME.unpack_from(buffer, offset)
+            if length > self.max_payload:
+                raise FramingError(f"frame of {length} bytes exceeds {self.max_payload}")
+            start = offset + FRAME.size
+            if end - start < length:
+                break
+            frames.append((request_id, bytes(buffer[start:start + length])))
+            offset = start + length
+        if offset:
+            del buffer[:offset]
+        return frames
@@ -0,0 +1,382 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import socket
+import threading
+import time
+from concurrent.futures import Future
+
+from tcp_framing import MAX_REQUEST_ID, FrameDecoder, FramingError, encode_frame
+
+# Pipelined request/response client for a server started with --framed
+# (tcp_server.py --mode loop|pool --framed). Requests are written without
+# waiting for earlier replies; each reply frame carries the request id it
+# answers, which resolves the matching future.
+RECV_SIZE = 256 * 1024
+DEFAULT_IN_FLIGHT = 1024
+
+
+def _ids():
+    return (i % MAX_REQUEST_ID for i in itertools.count(1))
+
+
+class PipelinedConnection:
+    """
+    One TCP connection with up to max_in_flight outstanding requests.
+
+    submit() writes a request frame and returns a concurrent.futures.Future;
+    a reader thread resolves futures as replies arrive. Thread-safe: any
+    number of threads may submit on the same connection. When the connection
+    fails, every outstanding future gets the ConnectionError.
+    """
+
+    def __init__(self, host, port, max_in_flight=DEFAULT_IN_FLIGHT, connect_timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.error = None
+        self._ids = _ids()
+        self._pending = {}  # {request id: Future}
+        self._lock = threading.Lock()  # guards _ids, _pending and error
+        self._write_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    def submit(self, payload):
+        return self.submit_many([payload])[0]
+
+    def submit_many(self, payloads):
+        """
+        Send payloads as pipelined requests and return their futures in order.
+        Frames are coalesced into as few sendall() calls as the in-flight
+        limit allows.
+        """
+        futures = []
+        frames = []
+        try:
+            for payload in payloads:
+                if not self._slots.acquire(blocking=False):
+                    self._write(frames)  # let the server catch up before waiting for a slot
+                    frames = []
+                    self._slots.acquire()
+                future, frame = self._register(payload)
+                futures.append(future)
+                frames.append(frame)
+            self._write(frames)
+        except OSError as e:
+            self._fail(e)
+            raise self.error from e
+        return futures
+
+    def request(self, payload, timeout=None):
+        return self.submit(payload).result(timeout)
+
+    def _register(self, payload):
+        future = Future()
+        with self._lock:
+            if self.error is not None:
+                self._slots.release()
+                raise self.error
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        return future, encode_frame(request_id, payload)
+
+    def _write(self, frames):
+        if frames:
+            with self._write_lock:
+                self.sock.sendall(b''.join(frames))
+
+    def _read_loop(self):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = self.sock.recv(RECV_SIZE)
+                if not data:
+                    raise ConnectionError("server closed the connection")
+                for request_id, payload in decoder.feed(data):
+                    with self._lock:
+                        future = self._pending.pop(request_id, None)
+                    if future is not None:
+                        self._slots.release()
+                        future.set_result(payload)
+        except (OSError, FramingError) as e:
+            self._fail(e)
+
+    def _fail(self, exc):
+        with self._lock:
+            if self.error is None:
+                self.error = exc if isinstance(exc, ConnectionError) else ConnectionError(str(exc))
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            self._slots.release()
+            future.set_exception(self.error)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._reader.join()
+
+
+class ConnectionPool:
+    """
+    A fixed number of PipelinedConnections to one server. Each request goes to
+    the connection with the fewest outstanding requests; a connection that
+    has failed is replaced on next use.
+    """
+
+    def __init__(self, host, port, size=4, max_in_flight=DEFAULT_IN_FLIGHT):
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self.connections = [self._connect() for _ in range(size)]
+
+    def _connect(self):
+        return PipelinedConnection(self.host, self.port, self.max_in_flight)
+
+    def _healthy(self):
+        with self._lock:
+            for i, conn in enumerate(self.connections):
+                if conn.error is not None:
+                    conn.close()
+                    self.connections[i] = self._connect()
+            return list(self.connections)
+
+    def submit(self, payload):
+        return min(self._healthy(), key=lambda conn: conn.in_flight).submit(payload)
+
+    def request(self, payload, timeout=None):
+        return self.submit(payload).result(timeout)
+
+    def map(self, payloads, timeout=None):
+        """Send all payloads, spread evenly over the pool, and return the replies in order."""
+        payloads = list(payloads)
+        connections = self._healthy()
+        # One thread per connection, so one waiting for free slots does not hold up the others.
+        futures = [None] * len(payloads)
+        errors = []
+        def submit_share(index, conn):
+            try:
+                shares = conn.submit_many(payloads[index::len(connections)])
+            except ConnectionError as e:
+                errors.append(e)
+                return
+            futures[index::len(connections)] = shares
+        threads = [threading.Thread(target=submit_share, args=(index, conn))
+                   for index, conn in enumerate(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return [future.result(timeout) for future in futures]
+
+    def close(self):
+        with self._lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncPipelinedConnection:
+    """
+    asyncio counterpart of PipelinedConnection: `await request(payload)` from
+    any number of tasks shares the connection, with at most max_in_flight
+    requests outstanding. Frames written in the same event loop iteration are
+    joined into one write. Create with `await AsyncPipelinedConnection.connect()`.
+    """
+
+    HIGH_WATER = 1 << 20  # drain() once this much is buffered for sending
+
+    def __init__(self, reader, writer, max_in_flight=DEFAULT_IN_FLIGHT):
+        self.reader = reader
+        self.writer = writer
+        self.error = None
+        self._ids = _ids()
+        self._pending = {}  # {request id: asyncio.Future}
+        # In-flight limit. asyncio.Semaphore rescans all its waiters on every
+        # release, which is quadratic with thousands of queued requests; a
+        # FIFO of waiter futures handed slots directly is constant time.
+        self._free_slots = max_in_flight
+        self._slot_waiters = collections.deque()
+        self._outbox = []  # frames waiting for the end of this loop iteration
+        self._read_task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, host, port, max_in_flight=DEFAULT_IN_FLIGHT):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer, max_in_flight)
+
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    async def request(self, payload):
+        await self._acquire()
+        try:
+            if self.error is not None:
+                raise self.error
+            request_id = next(self._ids)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+            try:
+                if not self._outbox:
+                    asyncio.get_running_loop().call_soon(self._flush)
+                self._outbox.append(encode_frame(request_id, payload))
+                if self.writer.transport.get_write_buffer_size() > self.HIGH_WATER:
+                    await self.writer.drain()
+                return await future
+            finally:
+                self._pending.pop(request_id, None)
+        finally:
+            self._release()
+
+    async def _acquire(self):
+        if self._free_slots and not self._slot_waiters:
+            self._free_slots -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._slot_waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if not waiter.cancelled():
+                self._release()  # the slot was handed over just before the cancellation
+            raise
+
+    def _release(self):
+        while self._slot_waiters:
+            waiter = self._slot_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._free_slots += 1
+
+    def _flush(self):
+        frames, self._outbox = self._outbox, []
+        if not self.writer.is_closing():
+            self.writer.write(b''.join(frames))
+
+    async def _read_loop(self):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await self.reader.read(RECV_SIZE)
+                if not data:
+                    raise ConnectionError("server closed the connection")
+                for request_id, payload in decoder.feed(data):
+                    future = self._pending.pop(request_id, None)
+                    if future is not None and not future.done():
+                        future.set_result(payload)
+        except (OSError, FramingError) as e:
+            self.error = e if isinstance(e, ConnectionError) else ConnectionError(str(e))
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(self.error)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+        await self._read_task
+
+
+class AsyncConnectionPool:
+    """asyncio counterpart of ConnectionPool. Create with `await AsyncConnectionPool.connect()`."""
+
+    def __init__(self, host, port, connections, max_in_flight):
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight
+        self.connections = connections
+
+    @classmethod
+    async def connect(cls, host, port, size=4, max_in_flight=DEFAULT_IN_FLIGHT):
+        connections = await asyncio.gather(
+            *(AsyncPipelinedConnection.connect(host, port, max_in_flight) for _ in range(size)))
+        return cls(host, port, list(connections), max_in_flight)
+
+    async def _healthy(self):
+        for i, conn in enumerate(self.connections):
+            if conn.error is not None:
+                await conn.close()
+                self.connections[i] = await AsyncPipelinedConnection.connect(
+                    self.host, self.port, self.max_in_flight)
+        return self.connections
+
+    async def request(self, payload):
+        connections = await self._healthy()
+        return await min(connections, key=lambda conn: conn.in_flight).request(payload)
+
+    async def map(self, payloads):
+        """Send all payloads, spread evenly over the pool, and return the replies in order."""
+        connections = await self._healthy()
+        return await asyncio.gather(*(connections[i % len(connections)].request(payload)
+                                      for i, payload in enumerate(payloads)))
+
+    async def close(self):
+        await asyncio.gather(*(conn.close() for conn in self.connections))
+        self.connections = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def run_sync(host, port, payloads, connections, in_flight):
+    with ConnectionPool(host, port, connections, in_flight) as pool:
+        return pool.map(payloads)
+
+
+async def run_async(host, port, payloads, connections, in_flight):
+    async with await AsyncConnectionPool.connect(host, port, connections, in_flight) as pool:
+        return await pool.map(payloads)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Pipelined requests against tcp_server.py --framed; reports requests per second")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--api", choices=("sync", "async"), default="sync")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--in-flight", type=int, default=DEFAULT_IN_FLIGHT, help="per connection")
+    parser.add_argument("--payload", type=int, default=64, help="request size in bytes")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    payloads = [(b'%d ' % i).ljust(args.payload, b'x') for i in range(args.requests)]
+    start = time.perf_counter()
+    if args.api == "sync":
+        replies = run_sync(args.host, args.port, payloads, args.connections, args.in_flight)
+    else:
+        replies = asyncio.run(run_async(args.host, args.port, payloads, args.connections, args.in_flight))
+    elapsed = time.perf_counter() - start
+    echoed = sum(reply == payload for reply, payload in zip(replies, payloads))
+    print(f"{args.requests} requests over {args.connections} connections ({args.api}) in {elapsed:.3f} s: "
+          f"{args.requests / elapsed:.0f} requests/s, {echoed} echoed back unchanged")
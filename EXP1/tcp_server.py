@@ -1,30 +1,335 @@
+import argparse
+import importlib
+import queue
+import selectors
 import socket
+from concurrent.futures import ThreadPoolExecutor
 
-host = '172.18.110.126'
-port  = 12345
+from tcp_framing import FrameDecoder, FramingError, encode_frame
 
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.bind((host,port))
-    s.listen()
-    print(f"Listening on {host}:{port}")
-    conn,add = s.accept()
+# A handler takes the bytes of one recv() and returns the bytes to send back
+# (or None to send nothing). Any "module:function" can be plugged in with --handler.
+HANDLERS = {
+    'echo': lambda data: data,
+    'upper': lambda data: data.upper(),
+    'discard': lambda data: None,
+}
 
-    with conn:
-        print('Connected by', add)
 
+def load_handler(name):
+    if name in HANDLERS:
+        return HANDLERS[name]
+    module, _, function = name.partition(':')
+    if not function:
+        raise ValueError(f"unknown handler {name!r}; use one of {sorted(HANDLERS)} or module:function")
+    return getattr(importlib.import_module(module), function)
+
+
+def framed(handler):
+    """
+    Wrap handler for framed connections (see tcp_framing): the result makes a
+    fresh responder per connection, which reassembles request frames and
+    answers each with a frame carrying its request id (an empty payload when
+    the handler returns None), so pipelined requests can be matched up.
+    """
+    def responder():
+        decoder = FrameDecoder()
+
+        def respond(data):
+            replies = [encode_frame(request_id, handler(payload) or b'')
+                       for request_id, payload in decoder.feed(data)]
+            return b''.join(replies)
+        return respond
+    return responder
+
+
+def raw(handler):
+    """The unframed counterpart of framed(): every connection calls handler directly."""
+    return lambda: handler
+
+
+def raise_fd_limit():
+    """Raise the soft open-file limit to the hard limit (one fd per client)."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def listen(host, port, backlog):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(backlog)
+    return server
+
+
+def serve_interactive(host, port):
+    """The original lab server: one client, every reply typed by the operator."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((host,port))
+        s.listen()
+        print(f"Listening on {host}:{port}")
+        conn,add = s.accept()
+
+        with conn:
+            print('Connected by', add)
+
+            while True:
+                data = conn.recv(1024).decode()
+
+                if not data:
+                    break
+                if data.lower() == 'exit':
+                    print('Connection closed by client.')
+                    break
+                print(f'Client: {data}')
+                reply = input('Server: ')
+                conn.sendall(reply.encode())
+
+                if reply.lower() == 'exit':
+                    print('Connection closed by server.')
+                    break
+
+
+class EventLoopServer:
+    """
+    Single-threaded server: one selectors loop, non-blocking sockets, the
+    handler runs inline. Suits cheap handlers (echo) and many thousands of
+    mostly idle connections; replies the kernel cannot take yet are kept per
+    connection and written when the socket becomes writable. A client that
+    sends requests without reading the replies is not read from while more
+    than `high_water` bytes are queued for it, until the queue drains to
+    `low_water`. `responder` is raw(handler) or framed(handler).
+    """
+
+    def __init__(self, host, port, responder, backlog=1024, bufsize=65536, high_water=1 << 20,
+                 low_water=256 << 10):
+        self.responder = responder
+        self.bufsize = bufsize
+        self.high_water = high_water
+        self.low_water = low_water
+        self.server = listen(host, port, backlog)
+        self.server.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.pending = {}  # {socket: bytearray of unsent reply bytes}
+        self.responders = {}  # {socket: respond(data) -> reply}
+
+    def serve_forever(self):
+        while True:
+            for key, events in self.selector.select():
+                if key.fileobj is self.server:
+                    self._accept()
+                else:
+                    if events & selectors.EVENT_WRITE:
+                        self._write(key.fileobj)
+                    if events & selectors.EVENT_READ and key.fileobj in self.pending:
+                        self._read(key.fileobj)
+
+    def _accept(self):
         while True:
-            data = conn.recv(1024).decode()
+            try:
+                conn, _ = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"Accept failed: {e}")
+                return
+            conn.setblocking(False)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.pending[conn] = bytearray()
+            self.responders[conn] = self.responder()
+            self.selector.register(conn, selectors.EVENT_READ)
+
+    def _read(self, conn):
+        try:
+            data = conn.recv(self.bufsize)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close(conn)
+            return
+        try:
+            reply = self.responders[conn](data)
+        except FramingError as e:
+            print(f"Closing connection: {e}")
+            self._close(conn)
+            return
+        except Exception as e:
+            print(f"Handler error: {e!r}")
+            self._close(conn)
+            return
+        if not reply:
+            return
+        out = self.pending[conn]
+        if out:
+            out += reply
+        else:
+            try:
+                sent = conn.send(reply)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self._close(conn)
+                return
+            if sent == len(reply):
+                return
+            out += reply[sent:]
+        # Stop reading from a client that is not reading its replies.
+        events = selectors.EVENT_WRITE
+        if len(out) <= self.high_water:
+            events |= selectors.EVENT_READ
+        if events != self.selector.get_key(conn).events:
+            self.selector.modify(conn, events)
+
+    def _write(self, conn):
+        out = self.pending[conn]
+        try:
+            sent = conn.send(out)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(conn)
+            return
+        del out[:sent]
+        events = self.selector.get_key(conn).events
+        if not out:
+            self.selector.modify(conn, selectors.EVENT_READ)
+        elif not events & selectors.EVENT_READ and len(out) <= self.low_water:
+            self.selector.modify(conn, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+    def _close(self, conn):
+        self.selector.unregister(conn)
+        del self.pending[conn]
+        del self.responders[conn]
+        conn.close()
+
+
+class WorkerPoolServer:
+    """
+    Selector plus thread pool: the main thread only waits for readiness, and
+    each readable connection is handed to one of `workers` threads, which does
+    the recv(), runs the handler and sends the reply with a blocking sendall().
+    A connection is not watched while a worker owns it, so requests on one
+    connection are handled in order. Suits handlers that block or release the
+    GIL (I/O, C extensions); thousands of connections still need no more
+    threads than `workers`. `responder` is raw(handler) or framed(handler).
+    """
+
+    def __init__(self, host, port, responder, workers=32, backlog=1024, bufsize=65536):
+        self.responder = responder
+        self.responders = {}  # {socket: respond(data) -> reply}, used by the owning worker
+        self.bufsize = bufsize
+        self.server = listen(host, port, backlog)
+        self.server.setblocking(False)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.rearm = queue.SimpleQueue()  # connections handed back by the workers
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ)
+
+    def serve_forever(self):
+        while True:
+            for key, events in self.selector.select():
+                if key.fileobj is self.server:
+                    self._accept()
+                elif key.fileobj is self._wakeup_r:
+                    self._rearm()
+                else:
+                    self.selector.unregister(key.fileobj)
+                    self.pool.submit(self._serve_once, key.fileobj)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                print(f"Accept failed: {e}")
+                return
+            conn.setblocking(True)  # only read when readable; sendall may block a worker
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.responders[conn] = self.responder()
+            self.selector.register(conn, selectors.EVENT_READ)
+
+    def _serve_once(self, conn):
+        try:
+            data = conn.recv(self.bufsize)
+            if data:
+                reply = self.responders[conn](data)
+                if reply:
+                    conn.sendall(reply)
+        except OSError:
+            data = b''
+        except Exception as e:
+            print(f"Handler error: {e!r}")
+            data = b''
+        if not data:
+            del self.responders[conn]
+            conn.close()
+            return
+        self.rearm.put(conn)
+        try:
+            self._wakeup_w.send(b'\0')
+        except BlockingIOError:
+            pass  # a wakeup is already pending
+
+    def _rearm(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                conn = self.rearm.get_nowait()
+            except queue.Empty:
+                return
+            self.selector.register(conn, selectors.EVENT_READ)
+
 
-            if not data:
-                break
-            if data.lower == 'exit':
-                print('Connection closed by client.')
-                break
-            print(f'Client: {data}')
-            reply = input('Server: ')
-            conn.sendall(reply.encode())
+def parse_args():
+    parser = argparse.ArgumentParser(description="TCP server (interactive, worker pool or event loop)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--mode", choices=("interactive", "pool", "loop"), default="interactive",
+                        help="interactive: one client, replies typed by hand (default); "
+                             "pool: thread pool; loop: single-threaded event loop")
+    parser.add_argument("--handler", default="echo",
+                        help=f"{', '.join(sorted(HANDLERS))} or module:function (non-interactive modes)")
+    parser.add_argument("--framed", action="store_true",
+                        help="length-prefixed frames with request ids, for pipelined clients (tcp_pipeline.py)")
+    parser.add_argument("--workers", type=int, default=32, help="threads in pool mode")
+    parser.add_argument("--backlog", type=int, default=1024)
+    return parser.parse_args()
 
-            if reply.lower() == 'exit':
-                print('Connection closed by server.')
-                break
 
+if __name__ == "__main__":
+    args = parse_args()
+    if args.mode == "interactive":
+        serve_interactive(args.host, args.port)
+    else:
+        raise_fd_limit()
+        handler = load_handler(args.handler)
+        responder = framed(handler) if args.framed else raw(handler)
+        if args.mode == "pool":
+            server = WorkerPoolServer(args.host, args.port, responder, args.workers, args.backlog)
+        else:
+            server = EventLoopServer(args.host, args.port, responder, args.backlog)
+        framing = "framed" if args.framed else "raw"
+        print(f"Listening on {args.host}:{args.port} ({args.mode} mode, {args.handler} handler, {framing})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Server stopped.")
@@ -0,0 +1,288 @@
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+
+# Request:  magic b'XFR2' | op (b'P' put / b'G' get) | uint16 name length | uint64 offset
+#           | fingerprint | name
+#           put: offset 0, fingerprint of the file being uploaded
+#           get: bytes already in the .part file and the fingerprint saved with it (zeros if none)
+# Reply:    uint8 status (0 ok, 1 error) | uint64 offset | fingerprint
+#           offset = where the transfer resumes (error: message length, message follows)
+#           fingerprint = of the file being stored (put) or served (get)
+# A fingerprint is the source file's uint64 size and uint64 mtime in ns. A
+# partial file is only resumed if the fingerprint saved next to it (in
+# .part.src) matches, so a different file with the same name starts over.
+# Put then streams size - offset bytes client -> server and ends with a uint64
+# ack of the bytes stored; get streams size - offset bytes server -> client.
+MAGIC = b'XFR2'
+FINGERPRINT = struct.Struct('!QQ')
+REQUEST = struct.Struct('!4scHQ' + FINGERPRINT.format[1:])
+REPLY = struct.Struct('!BQ' + FINGERPRINT.format[1:])
+ACK = struct.Struct('!Q')
+PUT, GET = b'P', b'G'
+OK, ERROR = 0, 1
+BUFFER_SIZE = 4 << 20
+PART_SUFFIX = '.part'
+SOURCE_SUFFIX = '.part.src'
+NO_FINGERPRINT = (0, 0)
+
+
+class TransferError(Exception):
+    pass
+
+
+def recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed mid-header")
+        data += chunk
+    return bytes(data)
+
+
+def receive_to_file(sock, f, count, buffer):
+    """
+    Copy exactly count bytes from sock to the unbuffered file f.
+
+    Bytes are received with recv_into() straight into the preallocated
+    buffer, which is written out only when full (or at the end), so the loop
+    allocates nothing per chunk and writes in large blocks.
+    """
+    view = memoryview(buffer)
+    remaining = count
+    filled = 0
+    try:
+        while remaining:
+            n = sock.recv_into(view[filled:filled + min(len(view) - filled, remaining)])
+            if not n:
+                raise ConnectionError(f"connection closed with {remaining} bytes outstanding")
+            filled += n
+            remaining -= n
+            if filled == len(view) or not remaining:
+                _write_all(f, view[:filled])
+                filled = 0
+    finally:
+        if filled:
+            _write_all(f, view[:filled])  # keep what arrived, so a retry can resume
+        view.release()
+
+
+def _write_all(f, data):
+    while data:
+        written = f.write(data)
+        data = data[written:]
+
+
+def _part_path(path):
+    return path + PART_SUFFIX
+
+
+def _fingerprint(f):
+    st = os.fstat(f.fileno())
+    return st.st_size, st.st_mtime_ns
+
+
+def _saved_part(path):
+    """(bytes in path's .part file, fingerprint of its source); zeros if there is none."""
+    try:
+        with open(path + SOURCE_SUFFIX, 'rb') as f:
+            fingerprint = FINGERPRINT.unpack(f.read(FINGERPRINT.size))
+        return os.path.getsize(_part_path(path)), fingerprint
+    except (OSError, struct.error):
+        return 0, NO_FINGERPRINT
+
+
+def _resume_offset(offset, saved, fingerprint):
+    """offset if the partial file came from this source and fits in it, else 0."""
+    return offset if saved == fingerprint and offset <= fingerprint[0] else 0
+
+
+def _open_part(path, offset, fingerprint):
+    """
+    Open path's .part file for writing at offset, cutting off anything after
+    it. A fresh file records the fingerprint of its source first, so a .part
+    never exists without the fingerprint it has to match.
+    """
+    if not offset:
+        with open(path + SOURCE_SUFFIX, 'wb') as f:
+            f.write(FINGERPRINT.pack(*fingerprint))
+    f = open(_part_path(path), 'r+b' if offset else 'wb', buffering=0)
+    f.truncate(offset)
+    f.seek(offset)
+    return f
+
+
+def _complete_part(path):
+    os.replace(_part_path(path), path)
+    try:
+        os.remove(path + SOURCE_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def report(action, name, count, seconds, offset=0):
+    rate = count / seconds if seconds else float('inf')
+    resumed = f" (resumed at {offset} bytes)" if offset else ""
+    print(f"{action} {name}: {count} bytes in {seconds:.3f} s, "
+          f"{rate / 1e6:.1f} MB/s ({rate * 8 / 1e9:.2f} Gbit/s){resumed}")
+
+
+def _safe_name(directory, name):
+    base = os.path.basename(name)
+    if not base or base in ('.', '..') or base != name or base.endswith((PART_SUFFIX, SOURCE_SUFFIX)):
+        raise TransferError(f"invalid file name {name!r}")
+    return os.path.join(directory, base)
+
+
+class TransferServer:
+    """Stores uploads in and serves downloads from one directory; a thread per connection."""
+
+    def __init__(self, host, port, directory, buffer_size=BUFFER_SIZE):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        os.makedirs(directory, exist_ok=True)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(64)
+
+    def serve_forever(self):
+        while True:
+            conn, addr = self.server.accept()
+            threading.Thread(target=self.handle, args=(conn, addr), daemon=True).start()
+
+    def handle(self, conn, addr):
+        with conn:
+            try:
+                magic, op, name_len, offset, *fingerprint = REQUEST.unpack(recv_exact(conn, REQUEST.size))
+                if magic != MAGIC:
+                    raise TransferError("not a transfer request")
+                name = recv_exact(conn, name_len).decode('utf-8')
+                path = _safe_name(self.directory, name)
+                if op == PUT:
+                    self._receive(conn, name, path, tuple(fingerprint))
+                elif op == GET:
+                    self._send(conn, name, path, offset, tuple(fingerprint))
+                else:
+                    raise TransferError(f"unknown operation {op!r}")
+            except TransferError as e:
+                message = str(e).encode('utf-8')
+                conn.sendall(REPLY.pack(ERROR, len(message), *NO_FINGERPRINT) + message)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Transfer from {addr} failed: {e}")
+
+    def _receive(self, conn, name, path, fingerprint):
+        size = fingerprint[0]
+        offset = _resume_offset(*_saved_part(path), fingerprint)
+        with _open_part(path, offset, fingerprint) as f:
+            conn.sendall(REPLY.pack(OK, offset, *fingerprint))
+            start = time.perf_counter()
+            receive_to_file(conn, f, size - offset, bytearray(self.buffer_size))
+            os.fsync(f.fileno())
+        _complete_part(path)
+        conn.sendall(ACK.pack(size))
+        report("Received", name, size - offset, time.perf_counter() - start, offset)
+
+    def _send(self, conn, name, path, offset, saved):
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            raise TransferError(f"no such file {name!r}")
+        with f:
+            fingerprint = _fingerprint(f)
+            size = fingerprint[0]
+            offset = _resume_offset(offset, saved, fingerprint)
+            conn.sendall(REPLY.pack(OK, offset, *fingerprint))
+            start = time.perf_counter()
+            if size > offset:
+                conn.sendfile(f, offset, size - offset)
+        report("Sent", name, size - offset, time.perf_counter() - start, offset)
+
+
+def _request(sock, op, name, offset, fingerprint):
+    """Send a request; returns the offset to resume from and the fingerprint of the file."""
+    encoded = name.encode('utf-8')
+    sock.sendall(REQUEST.pack(MAGIC, op, len(encoded), offset, *fingerprint) + encoded)
+    status, offset, *fingerprint = REPLY.unpack(recv_exact(sock, REPLY.size))
+    if status != OK:
+        raise TransferError(recv_exact(sock, offset).decode('utf-8', 'replace'))
+    return offset, tuple(fingerprint)
+
+
+def put_file(host, port, path, name=None):
+    """
+    Upload path with socket.sendfile() (zero-copy on Linux). If an earlier
+    upload of the same file (same size and mtime) was interrupted, the server
+    answers with the bytes it already has and only the rest is sent.
+    Returns bytes sent.
+    """
+    name = name or os.path.basename(path)
+    with open(path, 'rb') as f, socket.create_connection((host, port)) as sock:
+        fingerprint = _fingerprint(f)
+        size = fingerprint[0]
+        offset, _ = _request(sock, PUT, name, 0, fingerprint)
+        start = time.perf_counter()
+        if size > offset:
+            sock.sendfile(f, offset, size - offset)
+        stored, = ACK.unpack(recv_exact(sock, ACK.size))
+        elapsed = time.perf_counter() - start
+    if stored != size:
+        raise TransferError(f"server stored {stored} of {size} bytes")
+    report("Uploaded", name, size - offset, elapsed, offset)
+    return size - offset
+
+
+def get_file(host, port, name, path=None, buffer_size=BUFFER_SIZE):
+    """
+    Download name into path, resuming from path + '.part' if an earlier
+    download of the same file was interrupted; if the server's file has
+    changed since (or the .part is longer than it), the download starts
+    over. Returns bytes received.
+    """
+    path = path or name
+    with socket.create_connection((host, port)) as sock:
+        offset, fingerprint = _request(sock, GET, name, *_saved_part(path))
+        size = fingerprint[0]
+        with _open_part(path, offset, fingerprint) as f:
+            start = time.perf_counter()
+            receive_to_file(sock, f, size - offset, bytearray(buffer_size))
+            elapsed = time.perf_counter() - start
+    _complete_part(path)
+    report("Downloaded", name, size - offset, elapsed, offset)
+    return size - offset
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk file transfer over TCP (sendfile / recv_into)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12346)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="store uploads in and serve downloads from a directory")
+    serve.add_argument("--dir", default=".")
+    put = commands.add_parser("put", help="upload a file (resumes an interrupted upload)")
+    put.add_argument("path")
+    put.add_argument("--name", help="name on the server (default: the file's base name)")
+    get = commands.add_parser("get", help="download a file (resumes an interrupted download)")
+    get.add_argument("name")
+    get.add_argument("--out", help="local path (default: name)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        if args.command == "serve":
+            print(f"Serving {os.path.abspath(args.dir)} on {args.host}:{args.port}")
+            TransferServer(args.host, args.port, args.dir).serve_forever()
+        elif args.command == "put":
+            put_file(args.host, args.port, args.path, args.name)
+        else:
+            get_file(args.host, args.port, args.name, args.out)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, TransferError) as e:
+        raise SystemExit(f"Transfer failed: {e}")
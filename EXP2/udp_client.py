@@ -1,5 +1,8 @@
+import argparse
 import socket
 
+from udp_reliable import DISCONNECT, client_endpoint
+
 def start_client(host='127.0.0.1', port=65432):
     with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:  # Use SOCK_DGRAM for UDP
         print(f"UDP client ready to send messages to {host}:{port}")
@@ -16,6 +19,58 @@ def start_client(host='127.0.0.1', port=65432):
             data, server = s.recvfrom(1024)  # Receive response and server address
             print(f"Server says: {data.decode()}")
 
+def start_reliable_client(host='127.0.0.1', port=65432, window=64):
+    """
+    Interactive client over the reliable transport: each message is
+    retransmitted until the server acknowledges it, so a lost datagram no
+    longer hangs the session. Works with udp_server.py --reliable.
+    """
+    endpoint = client_endpoint(window=window)
+    channel = endpoint.connect((host, port))
+    print(f"Reliable UDP client ready to send messages to {host}:{port}")
+    try:
+        while True:
+            message = input("Enter message to send to server (type 'exit' to quit): ")
+            if message.lower() == 'exit':
+                print("Exiting client.")
+                channel.send(DISCONNECT)
+                try:
+                    channel.flush(timeout=5)
+                except (ConnectionError, TimeoutError):
+                    pass
+                break
+            channel.send(message.encode())
+            try:
+                channel.flush()
+            except ConnectionError as e:
+                print(f"Message not delivered: {e}")
+                break
+            reply = channel.recv(timeout=max(channel.rto, 0.1))  # an echoing server answers at once
+            if reply is not None:
+                print(f"Server says: {reply.decode(errors='replace')}")
+            else:
+                print("Delivered.")
+            while channel.inbox:
+                print(f"Server says: {channel.receive().decode(errors='replace')}")
+        print(f"Session stats: {channel.stats()}")
+    finally:
+        endpoint.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Interactive UDP client")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--reliable", action="store_true",
+                        help="use the reliable transport (server must run with --reliable)")
+    parser.add_argument("--window", type=int, default=64, help="reliable mode: messages in flight")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    start_client()
+    args = parse_args()
+    if args.reliable:
+        start_reliable_client(args.host, args.port, args.window)
+    else:
+        start_client(args.host, args.port)
 
@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+from udp_reliable import client_endpoint
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SENDER_STATS = ('sent', 'retransmits', 'spurious', 'timeouts', 'srtt_ms', 'rto_ms')
+
+
+def free_udp_port(host='127.0.0.1'):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def spawn(script, *args):
+    return subprocess.Popen([sys.executable, os.path.join(HERE, script), *map(str, args)],
+                            stdout=subprocess.DEVNULL)
+
+
+def stop(process):
+    process.terminate()
+    process.wait()
+
+
+def measure(host, port, messages, payload, window, timeout):
+    """Send messages reliably and time until the last one is acknowledged."""
+    endpoint = client_endpoint(window=window)
+    channel = endpoint.connect((host, port))
+    data = b'x' * payload
+    try:
+        start = time.perf_counter()
+        for _ in range(messages):
+            channel.send(data)
+        channel.flush(timeout)
+        elapsed = time.perf_counter() - start
+    finally:
+        endpoint.close()
+    return elapsed, channel.stats()
+
+
+def wait_for_server(host, port, timeout=10.0):
+    """One reliable round trip to make sure the server and proxy are up."""
+    endpoint = client_endpoint(initial_rto=0.1)
+    try:
+        channel = endpoint.connect((host, port))
+        channel.send(b'')
+        channel.flush(timeout)
+    finally:
+        endpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Goodput of the reliable UDP transport versus emulated loss, as JSON lines")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0, 0.01, 0.02, 0.05, 0.1, 0.2])
+    parser.add_argument("--window", type=int, nargs="+", default=[1, 64],
+                        help="window sizes to compare; 1 is stop-and-wait")
+    parser.add_argument("--delay", type=float, default=1.0, help="one-way delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms")
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--payload", type=int, default=1200, help="bytes per message")
+    parser.add_argument("--timeout", type=float, default=120.0, help="give up on a run after this many seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", metavar="PATH", help="append JSON lines to PATH instead of stdout")
+    args = parser.parse_args()
+
+    server_port = free_udp_port(args.host)
+    server = spawn('udp_server.py', '--reliable', '--reply', 'none', '--quiet',
+                   '--host', args.host, '--port', server_port, '--window', max(args.window))
+    out = open(args.out, "a") if args.out else sys.stdout
+    try:
+        for loss in args.loss:
+            proxy_port = free_udp_port(args.host)
+            proxy = spawn('udp_netem.py', '--listen-host', args.host, '--listen-port', proxy_port,
+                          '--target-host', args.host, '--target-port', server_port,
+                          '--loss', loss, '--delay', args.delay, '--jitter', args.jitter,
+                          '--reorder', args.reorder, '--seed', args.seed)
+            try:
+                wait_for_server(args.host, proxy_port)
+                for window in args.window:
+                    record = {'loss': loss, 'delay_ms': args.delay, 'jitter_ms': args.jitter,
+                              'reorder': args.reorder, 'window': window, 'messages': args.messages,
+                              'payload': args.payload}
+                    try:
+                        elapsed, stats = measure(args.host, proxy_port, args.messages, args.payload,
+                                                 window, args.timeout)
+                    except (ConnectionError, TimeoutError) as e:
+                        record['error'] = str(e)
+                    else:
+                        record.update(seconds=elapsed,
+                                      goodput_mbps=args.messages * args.payload * 8 / elapsed / 1e6,
+                                      messages_per_sec=args.messages / elapsed)
+                        record.update((key, stats[key]) for key in SENDER_STATS)
+                    record['python'] = platform.python_version()
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+            finally:
+                stop(proxy)
+    finally:
+        stop(server)
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
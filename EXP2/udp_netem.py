@@ -0,0 +1,130 @@
+import argparse
+import heapq
+import random
+import selectors
+import socket
+import time
+
+
+class UdpNetem:
+    """
+    UDP proxy that emulates a bad network between clients and one server.
+
+    Clients send to the listen address; every client gets its own upstream
+    socket towards the target, so replies find their way back. Each
+    datagram, in either direction, is dropped with probability `loss`,
+    otherwise delayed by `delay` plus a uniform 0..`jitter` seconds. With
+    probability `reorder` it is held back a further `reorder_gap` seconds,
+    so datagrams sent after it overtake it.
+    """
+
+    def __init__(self, listen, target, loss=0.0, delay=0.0, jitter=0.0, reorder=0.0,
+                 reorder_gap=0.005, seed=None):
+        self.target = target
+        self.loss = loss
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.reorder_gap = reorder_gap
+        self.random = random.Random(seed)
+        self.selector = selectors.DefaultSelector()
+        self.front = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.front.bind(listen)
+        self.front.setblocking(False)
+        self.selector.register(self.front, selectors.EVENT_READ, None)
+        self.upstreams = {}  # {client address: socket connected to the target}
+        self.scheduled = []  # heap of (due time, tie breaker, socket, data, address or None)
+        self.counter = 0
+        self.forwarded = self.dropped = self.reordered = 0
+
+    def _upstream(self, client):
+        sock = self.upstreams.get(client)
+        if sock is None:
+            sock = self.upstreams[client] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.connect(self.target)
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, client)
+        return sock
+
+    def _schedule(self, now, sock, data, address):
+        if self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        due = now + self.delay
+        if self.jitter:
+            due += self.random.uniform(0, self.jitter)
+        if self.reorder and self.random.random() < self.reorder:
+            due += self.reorder_gap
+            self.reordered += 1
+        self.counter += 1
+        heapq.heappush(self.scheduled, (due, self.counter, sock, data, address))
+
+    def _deliver_due(self, now):
+        scheduled = self.scheduled
+        while scheduled and scheduled[0][0] <= now:
+            _, _, sock, data, address = heapq.heappop(scheduled)
+            try:
+                if address is None:
+                    sock.send(data)
+                else:
+                    sock.sendto(data, address)
+                self.forwarded += 1
+            except OSError:
+                self.dropped += 1
+
+    def serve_forever(self):
+        while True:
+            now = time.monotonic()
+            self._deliver_due(now)
+            timeout = max(0.0, self.scheduled[0][0] - now) if self.scheduled else None
+            for key, _ in self.selector.select(timeout):
+                now = time.monotonic()
+                while True:
+                    try:
+                        if key.data is None:
+                            data, client = self.front.recvfrom(65535)
+                            self._schedule(now, self._upstream(client), data, None)
+                        else:
+                            data = key.fileobj.recv(65535)
+                            self._schedule(now, self.front, data, key.data)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except ConnectionRefusedError:
+                        break  # the target is not listening (yet)
+
+    def close(self):
+        for sock in self.upstreams.values():
+            sock.close()
+        self.front.close()
+        self.selector.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="UDP proxy emulating loss, delay and reordering")
+    parser.add_argument("--listen-host", default="127.0.0.1")
+    parser.add_argument("--listen-port", type=int, default=65433)
+    parser.add_argument("--target-host", default="127.0.0.1")
+    parser.add_argument("--target-port", type=int, default=65432)
+    parser.add_argument("--loss", type=float, default=0.0, help="drop probability per datagram (0..1)")
+    parser.add_argument("--delay", type=float, default=0.0, help="one-way delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay, 0..JITTER ms")
+    parser.add_argument("--reorder", type=float, default=0.0, help="probability of holding a datagram back")
+    parser.add_argument("--reorder-gap", type=float, default=5.0, help="how long a reordered datagram is held, ms")
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    netem = UdpNetem((args.listen_host, args.listen_port), (args.target_host, args.target_port),
+                     args.loss, args.delay / 1e3, args.jitter / 1e3, args.reorder, args.reorder_gap / 1e3,
+                     args.seed)
+    print(f"Forwarding {args.listen_host}:{args.listen_port} -> {args.target_host}:{args.target_port} "
+          f"(loss {args.loss:.1%}, delay {args.delay} ms, jitter {args.jitter} ms, reorder {args.reorder:.1%})")
+    try:
+        netem.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"forwarded {netem.forwarded}, dropped {netem.dropped}, reordered {netem.reordered}")
+        netem.close()
@@ -0,0 +1,390 @@
+import collections
+import selectors
+import socket
+import struct
+import time
+
+# DATA: uint8 type | uint32 sequence number | payload (one message per datagram)
+# ACK:  uint8 type | uint32 cumulative ack (next sequence number expected) |
+#       uint32 echo (sequence number of the latest DATA received, for RTT) |
+#       uint8 block count | that many (uint32 start, uint32 end) SACK blocks,
+#       the ranges [start, end) received above the cumulative ack
+DATA = 1
+ACK = 2
+DATA_HEADER = struct.Struct('!BI')
+ACK_HEADER = struct.Struct('!BIIB')
+SACK_BLOCK = struct.Struct('!II')
+MAX_SACK_BLOCKS = 8
+MAX_PAYLOAD = 65507 - DATA_HEADER.size
+RECEIVE_WINDOW = 4096  # out-of-order messages a receiver buffers per peer
+CLOCK_GRANULARITY = 0.001
+DISCONNECT = b'DISCONNECT'
+
+
+class Outstanding:
+    __slots__ = ('payload', 'sent_at', 'retransmitted', 'sacked')
+
+    def __init__(self, payload, sent_at):
+        self.payload = payload
+        self.sent_at = sent_at
+        self.retransmitted = False
+        self.sacked = False
+
+
+class ReliableChannel:
+    """
+    Reliable, in-order message delivery to one peer over a shared UDP socket.
+
+    Sender: at most `window` messages are in flight (sent, neither
+    cumulatively nor selectively acknowledged) and the span of unacknowledged
+    sequence numbers stays within the receiver's RECEIVE_WINDOW; the rest
+    wait in a backlog. The retransmission
+    timeout follows RFC 6298 (SRTT/RTTVAR, Karn's rule, exponential backoff).
+    Losses are found without waiting for the timeout once a message sent
+    later is acknowledged (cumulatively or by SACK) more than a reordering
+    window after it. The window starts at a quarter of the minimum RTT and
+    grows by that much, up to SRTT, whenever a retransmission proves
+    spurious (the original is acknowledged sooner than a round trip after
+    the retransmission), as RACK does. RTT is sampled only
+    from the message each ACK echoes, so time spent waiting behind a hole
+    does not count. The window is fixed: there is no congestion control.
+
+    Receiver: messages are delivered to `inbox` in sequence order;
+    out-of-order ones are buffered and reported back in SACK blocks. ACKs
+    are sent once per received batch, not per datagram.
+
+    Channels are driven by a ReliableEndpoint; nothing here blocks.
+    """
+
+    def __init__(self, endpoint, peer, window=64, initial_rto=1.0, min_rto=0.02, max_rto=2.0,
+                 max_timeouts=10):
+        self.endpoint = endpoint
+        self.peer = peer
+        self.window = window
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.max_timeouts = max_timeouts
+        # sender
+        self.next_seq = 0
+        self.backlog = collections.deque()
+        self.unacked = {}  # {seq: Outstanding}, in sequence order
+        self.sacked = 0  # entries of unacked that the receiver already holds
+        self.srtt = None
+        self.rttvar = None
+        self.min_rtt = None
+        self.rto = initial_rto
+        self.rto_deadline = None
+        self.rack_sent_at = 0.0  # send time of the latest-sent message known to have arrived
+        self.reorder_steps = 1  # reordering window, in quarters of the minimum RTT
+        self.spurious = 0
+        self.consecutive_timeouts = 0
+        self.failed = False
+        # receiver
+        self.expected = 0
+        self.latest_received = 0
+        self.out_of_order = {}
+        self.inbox = collections.deque()
+        self.ack_due = False
+        self.last_heard = time.monotonic()
+        self.closed_at = None
+        # counters
+        self.sent = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.duplicates = 0
+        self.acks_sent = 0
+
+    @property
+    def idle(self):
+        """True when everything sent so far has been acknowledged."""
+        return not self.unacked and not self.backlog
+
+    def send(self, payload):
+        if len(payload) > MAX_PAYLOAD:
+            raise ValueError(f"message of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+        if self.failed:
+            raise ConnectionError(f"peer {self.peer} stopped acknowledging")
+        self.backlog.append(payload)
+        self._fill_window(time.monotonic())
+
+    def receive(self):
+        """The next delivered message, or None."""
+        return self.inbox.popleft() if self.inbox else None
+
+    def flush(self, timeout=None):
+        """Drive the endpoint until everything sent has been acknowledged."""
+        self.endpoint.run_until(lambda: self.idle, self, timeout)
+
+    def recv(self, timeout=None):
+        """Drive the endpoint until a message arrives; None on timeout."""
+        try:
+            self.endpoint.run_until(lambda: self.inbox, self, timeout)
+        except TimeoutError:
+            return None
+        return self.inbox.popleft()
+
+    def close(self):
+        self.closed_at = time.monotonic()
+
+    def stats(self):
+        return {
+            'sent': self.sent, 'retransmits': self.retransmits, 'spurious': self.spurious,
+            'timeouts': self.timeouts,
+            'delivered': self.expected, 'duplicates': self.duplicates, 'acks_sent': self.acks_sent,
+            'srtt_ms': self.srtt * 1e3 if self.srtt is not None else None, 'rto_ms': self.rto * 1e3,
+        }
+
+    # sender side
+
+    def _fill_window(self, now):
+        unacked = self.unacked
+        while self.backlog and len(unacked) - self.sacked < self.window:
+            seq = self.next_seq
+            if unacked and seq - next(iter(unacked)) >= RECEIVE_WINDOW:
+                break
+            self.next_seq += 1
+            out = self.unacked[seq] = Outstanding(self.backlog.popleft(), now)
+            self.sent += 1
+            self.endpoint.send_data(self.peer, seq, out.payload)
+        if self.unacked and self.rto_deadline is None:
+            self.rto_deadline = now + self.rto
+
+    def _retransmit(self, seq, out, now):
+        out.sent_at = now
+        out.retransmitted = True
+        self.retransmits += 1
+        self.endpoint.send_data(self.peer, seq, out.payload)
+
+    def on_ack(self, cumulative, echo, blocks, now):
+        self.last_heard = now
+        echoed = self.unacked.get(echo)
+        if echoed is not None and not echoed.sacked:
+            if not echoed.retransmitted:  # Karn's rule
+                self._sample_rtt(now - echoed.sent_at)
+            elif self.min_rtt is not None and now - echoed.sent_at < self.min_rtt / 2:
+                self.spurious += 1  # the original arrived; it was only reordered
+                self.reorder_steps += 1
+        delivered = False
+        advanced = False
+        unacked = self.unacked
+        while unacked:
+            seq = next(iter(unacked))
+            if seq >= cumulative:
+                break
+            out = unacked.pop(seq)
+            advanced = True
+            if out.sacked:
+                self.sacked -= 1
+            else:
+                delivered = True
+                self.rack_sent_at = max(self.rack_sent_at, out.sent_at)
+        for start, end in blocks:
+            for seq in range(max(start, cumulative), min(end, self.next_seq)):
+                out = unacked.get(seq)
+                if out is not None and not out.sacked:
+                    out.sacked = True
+                    self.sacked += 1
+                    delivered = True
+                    self.rack_sent_at = max(self.rack_sent_at, out.sent_at)
+        if advanced:
+            self.consecutive_timeouts = 0
+            self.rto_deadline = now + self.rto if unacked else None
+        if delivered and unacked:
+            reorder_window = min(self.reorder_steps * self.min_rtt / 4, self.srtt) if self.min_rtt else 0.0
+            for seq, out in unacked.items():
+                if not out.sacked and out.sent_at + reorder_window < self.rack_sent_at:
+                    self._retransmit(seq, out, now)
+        self._fill_window(now)
+
+    def _sample_rtt(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        self.rto = min(max(self.srtt + max(CLOCK_GRANULARITY, 4 * self.rttvar), self.min_rto), self.max_rto)
+
+    def on_timer(self, now):
+        if self.rto_deadline is None or now < self.rto_deadline:
+            return
+        self.timeouts += 1
+        self.consecutive_timeouts += 1
+        if self.consecutive_timeouts > self.max_timeouts:
+            self.failed = True
+            self.rto_deadline = None
+            return
+        self.rto = min(self.rto * 2, self.max_rto)
+        for seq, out in self.unacked.items():
+            if not out.sacked:
+                self._retransmit(seq, out, now)
+                break
+        self.rto_deadline = now + self.rto
+
+    # receiver side
+
+    def on_data(self, seq, payload, now):
+        self.last_heard = now
+        self.latest_received = seq
+        self.ack_due = True
+        if seq == self.expected:
+            self.inbox.append(payload)
+            self.expected += 1
+            while self.expected in self.out_of_order:
+                self.inbox.append(self.out_of_order.pop(self.expected))
+                self.expected += 1
+        elif self.expected < seq < self.expected + RECEIVE_WINDOW and seq not in self.out_of_order:
+            self.out_of_order[seq] = payload
+        else:
+            self.duplicates += 1
+
+    def ack_frame(self):
+        blocks = []
+        for seq in sorted(self.out_of_order):
+            if blocks and blocks[-1][1] == seq:
+                blocks[-1][1] = seq + 1
+            elif len(blocks) == MAX_SACK_BLOCKS:
+                break
+            else:
+                blocks.append([seq, seq + 1])
+        self.ack_due = False
+        self.acks_sent += 1
+        return ACK_HEADER.pack(ACK, self.expected, self.latest_received, len(blocks)) + b''.join(
+            SACK_BLOCK.pack(start, end) for start, end in blocks)
+
+
+class ReliableEndpoint:
+    """
+    One non-blocking UDP socket carrying ReliableChannels, one per peer.
+    With accept=True, a DATA datagram from an unknown address opens a channel
+    for it (server side). poll() does one round of I/O and timers.
+    """
+
+    def __init__(self, sock, accept=False, batch=256, idle_timeout=60.0, linger=2.0, **channel_options):
+        sock.setblocking(False)
+        self.sock = sock
+        self.accept = accept
+        self.batch = batch
+        self.idle_timeout = idle_timeout
+        self.linger = linger
+        self.channel_options = channel_options
+        self.channels = {}  # {address: ReliableChannel}
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(sock, selectors.EVENT_READ)
+        self.buffer = bytearray(65535)
+        self.next_expiry = time.monotonic() + 1.0
+
+    def connect(self, peer, **channel_options):
+        options = dict(self.channel_options, **channel_options)
+        channel = self.channels[peer] = ReliableChannel(self, peer, **options)
+        return channel
+
+    def send_data(self, peer, seq, payload):
+        try:
+            self.sock.sendmsg([DATA_HEADER.pack(DATA, seq), payload], (), 0, peer)
+        except (BlockingIOError, InterruptedError):
+            pass  # counts as lost; the retransmission logic covers it
+
+    def poll(self, timeout=None):
+        """Wait up to timeout for datagrams, handle them and any expired timers.
+        Returns the channels that have messages waiting in their inbox."""
+        now = time.monotonic()
+        deadlines = [c.rto_deadline for c in self.channels.values() if c.rto_deadline is not None]
+        if self.channels:
+            deadlines.append(self.next_expiry)
+        if deadlines:
+            wait = max(0.0, min(deadlines) - now)
+            timeout = wait if timeout is None else min(timeout, wait)
+        ready = []
+        if self.selector.select(timeout):
+            ready = self._drain()
+        now = time.monotonic()
+        for channel in list(self.channels.values()):
+            channel.on_timer(now)
+        if now >= self.next_expiry:
+            self._expire(now)
+        return ready
+
+    def _drain(self):
+        view = memoryview(self.buffer)
+        touched = {}
+        now = time.monotonic()
+        for _ in range(self.batch):
+            try:
+                nbytes, addr = self.sock.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionRefusedError:
+                continue  # ICMP port unreachable for an earlier send; retransmission handles it
+            if nbytes < DATA_HEADER.size:
+                continue
+            channel = self.channels.get(addr)
+            kind, number = DATA_HEADER.unpack_from(self.buffer)
+            if kind == DATA:
+                if channel is None:
+                    if not self.accept:
+                        continue
+                    channel = self.connect(addr)
+                touched[addr] = channel
+                if channel.closed_at is None:
+                    channel.on_data(number, bytes(view[DATA_HEADER.size:nbytes]), now)
+                else:
+                    channel.ack_due = True  # closing: acknowledge retransmissions only
+            elif kind == ACK and channel is not None and nbytes >= ACK_HEADER.size:
+                _, cumulative, echo, count = ACK_HEADER.unpack_from(self.buffer)
+                count = min(count, (nbytes - ACK_HEADER.size) // SACK_BLOCK.size)
+                blocks = [SACK_BLOCK.unpack_from(self.buffer, ACK_HEADER.size + i * SACK_BLOCK.size)
+                          for i in range(count)]
+                channel.on_ack(cumulative, echo, blocks, now)
+        view.release()
+        for addr, channel in touched.items():
+            if channel.ack_due:
+                try:
+                    self.sock.sendto(channel.ack_frame(), addr)
+                except (BlockingIOError, InterruptedError):
+                    pass
+        return [channel for channel in touched.values() if channel.inbox]
+
+    def _expire(self, now):
+        self.next_expiry = now + 1.0
+        for addr, channel in list(self.channels.items()):
+            if (channel.closed_at is not None and now - channel.closed_at > self.linger
+                    or channel.idle and now - channel.last_heard > self.idle_timeout):
+                del self.channels[addr]
+
+    def run_until(self, predicate, channel=None, timeout=None):
+        """poll() until predicate() is true. Raises ConnectionError if channel
+        fails and TimeoutError after timeout seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not predicate():
+            if channel is not None and channel.failed:
+                raise ConnectionError(f"peer {channel.peer} stopped acknowledging")
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    raise TimeoutError("timed out")
+            self.poll(wait)
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+
+
+def _udp_socket(rcvbuf):
+    # A full window of large messages must fit in the receive buffer, or the
+    # kernel drops the tail of every burst and it has to be retransmitted.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    return sock
+
+
+def client_endpoint(rcvbuf=4 << 20, **channel_options):
+    return ReliableEndpoint(_udp_socket(rcvbuf), **channel_options)
+
+
+def server_endpoint(host, port, rcvbuf=4 << 20, **channel_options):
+    sock = _udp_socket(rcvbuf)
+    sock.bind((host, port))
+    return ReliableEndpoint(sock, accept=True, **channel_options)
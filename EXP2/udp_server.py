@@ -1,4 +1,10 @@
+import argparse
+import os
+import selectors
 import socket
+import time
+
+from udp_reliable import DISCONNECT, server_endpoint
 
 def start_server(host='127.0.0.1', port=65432):
     with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:  # Use SOCK_DGRAM for UDP
@@ -22,6 +28,236 @@ def start_server(host='127.0.0.1', port=65432):
                 break
             s.sendto(reply.encode(), addr)  # Send reply to client address
 
+def serve_reliable(host='127.0.0.1', port=65432, reply='echo', verbose=True, window=64):
+    """
+    Non-interactive server over the reliable transport (udp_reliable.py): any
+    number of clients, each with its own channel. Every message is printed
+    (if verbose) and, with reply='echo', sent back reliably; DISCONNECT ends
+    that client's session only.
+    """
+    endpoint = server_endpoint(host, port, window=window)
+    print(f"Reliable UDP server listening on {host}:{port}...")
+    try:
+        while True:
+            for channel in endpoint.poll():
+                while channel.inbox:
+                    message = channel.inbox.popleft()
+                    if message == DISCONNECT:
+                        if verbose:
+                            print(f"Client {channel.peer} disconnected: {channel.stats()}")
+                        channel.close()
+                        break
+                    if verbose:
+                        print(f"Received message from {channel.peer}: {message.decode(errors='replace')}")
+                    if reply == 'echo':
+                        channel.send(message)
+    finally:
+        endpoint.close()
+
+
+class Session:
+    __slots__ = ('first_seen', 'last_seen', 'packets', 'bytes')
+
+    def __init__(self, now):
+        self.first_seen = now
+        self.last_seen = now
+        self.packets = 0
+        self.bytes = 0
+
+
+def kernel_drops(sock):
+    """Datagrams the kernel dropped for sock (receive buffer full), from /proc/net/udp; None elsewhere."""
+    inode = str(os.fstat(sock.fileno()).st_ino)
+    for table in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[9] == inode:
+                        return int(fields[12])
+        except (OSError, IndexError, ValueError):
+            continue
+    return None
+
+
+class BatchUdpServer:
+    """
+    Non-interactive, high-rate server: many clients at once, no prompts.
+
+    One non-blocking socket with a large receive buffer. On each wakeup it
+    drains up to `batch` datagrams with recvfrom_into() into one
+    preallocated buffer, handling each in place (echo replies are sent from
+    a memoryview of the same buffer), so the hot loop allocates only the
+    address tuple. Every address gets an entry in the session table (first
+    and last seen, packets, bytes); sessions idle for `session_timeout`
+    seconds are swept once per second, DISCONNECT ends one session, and at
+    most `max_sessions` exist at a time (datagrams from further addresses
+    are counted and ignored). Counters are summed per batch, not per datagram.
+    """
+
+    def __init__(self, host, port, reply='echo', batch=1024, rcvbuf=4 << 20, session_timeout=30.0,
+                 max_sessions=100000, bufsize=65535):
+        self.reply = reply
+        self.batch = batch
+        self.session_timeout = session_timeout
+        self.max_sessions = max_sessions
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.buffer = bytearray(bufsize)
+        self.sessions = {}  # {address: Session}
+        self.packets_in = self.bytes_in = self.packets_out = 0
+        self.send_dropped = self.rejected = self.sessions_opened = self.sessions_expired = 0
+        self.started_at = time.monotonic()
+        self.next_sweep = self.started_at + 1.0
+        self._last_report = (self.started_at, 0, 0, kernel_drops(self.sock) or 0)
+
+    def serve_forever(self, stats_interval=5.0):
+        next_stats = time.monotonic() + stats_interval if stats_interval else None
+        while True:
+            timeout = self.next_sweep - time.monotonic()
+            if next_stats is not None:
+                timeout = min(timeout, next_stats - time.monotonic())
+            if self.selector.select(max(0.0, timeout)):
+                self.drain()
+            now = time.monotonic()
+            if now >= self.next_sweep:
+                self.expire(now)
+            if next_stats is not None and now >= next_stats:
+                print(self.report(now))
+                next_stats = now + stats_interval
+
+    def drain(self):
+        """Receive and handle up to `batch` datagrams; returns how many."""
+        recv_into = self.sock.recvfrom_into
+        sendto = self.sock.sendto
+        buffer = self.buffer
+        view = memoryview(buffer)
+        sessions = self.sessions
+        echo = self.reply == 'echo'
+        now = time.monotonic()
+        packets = nbytes = sent = send_dropped = 0
+        try:
+            for _ in range(self.batch):
+                try:
+                    n, addr = recv_into(buffer)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except ConnectionRefusedError:
+                    continue  # ICMP error for an earlier reply
+                packets += 1
+                nbytes += n
+                session = sessions.get(addr)
+                if session is None:
+                    session = self._open(addr, now)
+                    if session is None:
+                        continue
+                session.last_seen = now
+                session.packets += 1
+                session.bytes += n
+                if n == len(DISCONNECT) and buffer[:n] == DISCONNECT:
+                    del sessions[addr]
+                    continue
+                if echo:
+                    try:
+                        sendto(view[:n], addr)
+                        sent += 1
+                    except OSError:  # full send buffer or unreachable peer
+                        send_dropped += 1
+        finally:
+            view.release()
+        self.packets_in += packets
+        self.bytes_in += nbytes
+        self.packets_out += sent
+        self.send_dropped += send_dropped
+        return packets
+
+    def _open(self, addr, now):
+        if len(self.sessions) >= self.max_sessions:
+            self.rejected += 1
+            return None
+        self.sessions_opened += 1
+        session = self.sessions[addr] = Session(now)
+        return session
+
+    def expire(self, now):
+        self.next_sweep = now + 1.0
+        cutoff = now - self.session_timeout
+        idle = [addr for addr, session in self.sessions.items() if session.last_seen < cutoff]
+        for addr in idle:
+            del self.sessions[addr]
+        self.sessions_expired += len(idle)
+
+    def stats(self):
+        return {
+            'uptime': time.monotonic() - self.started_at,
+            'sessions': len(self.sessions),
+            'packets_in': self.packets_in, 'bytes_in': self.bytes_in, 'packets_out': self.packets_out,
+            'send_dropped': self.send_dropped, 'rejected': self.rejected,
+            'sessions_opened': self.sessions_opened, 'sessions_expired': self.sessions_expired,
+            'kernel_drops': kernel_drops(self.sock),
+        }
+
+    def report(self, now):
+        """One line with rates since the previous report."""
+        then, packets_in, packets_out, drops = self._last_report
+        current_drops = kernel_drops(self.sock) or 0
+        elapsed = max(now - then, 1e-9)
+        self._last_report = (now, self.packets_in, self.packets_out, current_drops)
+        return (f"{(self.packets_in - packets_in) / elapsed:,.0f} pps in, "
+                f"{(self.packets_out - packets_out) / elapsed:,.0f} pps out, "
+                f"{len(self.sessions)} sessions, {current_drops - drops} kernel drops, "
+                f"{self.send_dropped} send drops, {self.rejected} rejected")
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="UDP server (interactive, reliable or high-rate batch)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65432)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--reliable", action="store_true",
+                      help="sequence numbers, ACK/SACK and retransmission; many clients, no prompts")
+    mode.add_argument("--batch", action="store_true",
+                      help="plain datagrams from many clients at a high rate, with a session table and counters")
+    parser.add_argument("--reply", choices=("echo", "none"), default="echo",
+                        help="reliable/batch mode: echo messages back or not")
+    parser.add_argument("--window", type=int, default=64, help="reliable mode: messages in flight per client")
+    parser.add_argument("--quiet", action="store_true", help="reliable mode: do not print messages")
+    parser.add_argument("--session-timeout", type=float, default=30.0, help="batch mode: expire idle sessions (s)")
+    parser.add_argument("--max-sessions", type=int, default=100000, help="batch mode")
+    parser.add_argument("--rcvbuf", type=int, default=4 << 20,
+                        help="batch mode: requested SO_RCVBUF (capped by net.core.rmem_max)")
+    parser.add_argument("--stats-interval", type=float, default=5.0,
+                        help="batch mode: print rates every N seconds (0 = never)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    start_server()
+    args = parse_args()
+    if args.reliable:
+        try:
+            serve_reliable(args.host, args.port, args.reply, not args.quiet, args.window)
+        except KeyboardInterrupt:
+            print("Closing server.")
+    elif args.batch:
+        server = BatchUdpServer(args.host, args.port, args.reply, rcvbuf=args.rcvbuf,
+                                session_timeout=args.session_timeout, max_sessions=args.max_sessions)
+        rcvbuf = server.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        print(f"UDP batch server listening on {args.host}:{args.port} (reply {args.reply}, SO_RCVBUF {rcvbuf})")
+        try:
+            server.serve_forever(args.stats_interval)
+        except KeyboardInterrupt:
+            print(f"Closing server: {server.stats()}")
+        finally:
+            server.close()
+    else:
+        start_server(args.host, args.port)
 
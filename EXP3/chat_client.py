@@ -1,11 +1,23 @@
 import socket
 import threading
 import tkinter as tk
+from collections import deque
 from tkinter import scrolledtext, messagebox, simpledialog
 
+from chat_protocol import (CHAT, DIRECT, JOIN, LEAVE, ROOM_CHAT, ROOM_JOIN, ROOM_LEAVE, FrameReader,
+                           ProtocolError, pack_target, send_frame)
+
 class ChatClient:
-    def __init__(self):
+    # Incoming messages are collected by the receive thread and written to the
+    # transcript in one batch per frame, at most 1000 / FRAME_INTERVAL_MS times a second.
+    FRAME_INTERVAL_MS = 50
+
+    def __init__(self, max_transcript_lines=2000):
+        self.max_transcript_lines = max_transcript_lines  # older lines are dropped
+        # deque.append / popleft are thread-safe; maxlen bounds memory even if the UI stalls.
+        self.pending = deque(maxlen=max_transcript_lines)
         self.client_socket = None
+        self.reader = None
         self.username = None
         self.connected = False
         self.online_users = []
@@ -66,6 +78,8 @@ class ChatClient:
         self.message_input.config(state="disabled")
         self.send_button.config(state="disabled")
         
+        self.root.after(self.FRAME_INTERVAL_MS, self.flush_messages)
+        
     def connect_to_server(self):
         if self.connected:
             return
@@ -88,14 +102,22 @@ class ChatClient:
             self.client_socket.connect((host, port))
             
             # Send username
-            self.client_socket.send(username.encode('utf-8'))
+            send_frame(self.client_socket, JOIN, username)
             
             # Check if username is accepted
-            response = self.client_socket.recv(1024).decode('utf-8')
+            self.reader = FrameReader()
+            frame = self.reader.next_frame(self.client_socket)
+            if frame is None:
+                raise ConnectionError("server closed the connection")
+            response = str(frame[1], 'utf-8')
             if response == "USERNAME_TAKEN":
                 messagebox.showerror("Error", "Username already taken")
                 self.client_socket.close()
                 return
+            if response != "USERNAME_OK":
+                messagebox.showerror("Error", "Username cannot contain line breaks")
+                self.client_socket.close()
+                return
             
             # Setup successful connection
             self.username = username
@@ -123,6 +145,7 @@ class ChatClient:
             self.display_message("Connected to the server. Welcome to the chat!")
             # Display client's own name in the chatbox upon connection
             self.display_message(f"You are connected as {username}.")
+            self.display_message("Commands: /join <room>, /leave <room>, /room <room> <text>, /msg <user> <text>")
             
         except Exception as e:
             messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}")
@@ -131,6 +154,10 @@ class ChatClient:
     
     def disconnect(self):
         if self.connected:
+            try:
+                send_frame(self.client_socket, LEAVE, b"")
+            except OSError:
+                pass
             try:
                 self.client_socket.close()
             except:
@@ -153,20 +180,54 @@ class ChatClient:
     def receive_messages(self):
         while self.connected:
             try:
-                message = self.client_socket.recv(1024).decode('utf-8')
+                frame = self.reader.next_frame(self.client_socket)
                 
-                if not message:
+                if frame is None:
                     # Connection closed by server
                     self.root.after(0, self.handle_disconnect, "Server connection closed")
                     break
                 
                 # Display the received message
-                self.root.after(0, self.display_message, message)
+                self.pending.append(self.format_frame(*frame))
             except Exception as e:
                 if self.connected:  # Only show error if we weren't explicitly disconnecting
                     self.root.after(0, self.handle_disconnect, f"Connection error: {str(e)}")
                 break
     
+    @staticmethod
+    def format_frame(frame_type, payload):
+        text = str(payload, 'utf-8', 'replace')
+        if frame_type == JOIN:
+            return f"SERVER: {text} has joined the chat!"
+        if frame_type == LEAVE:
+            return f"SERVER: {text} has left the chat!"
+        if frame_type in (ROOM_JOIN, ROOM_LEAVE, ROOM_CHAT, DIRECT):
+            target, _, body = text.partition("\n")
+            if frame_type == ROOM_JOIN:
+                return f"[{target}] SERVER: {body} has joined the room!"
+            if frame_type == ROOM_LEAVE:
+                return f"[{target}] SERVER: {body} has left the room!"
+            if frame_type == ROOM_CHAT:
+                return f"[{target}] {body}"
+            return f"[from {target}] {body}"
+        return text  # CHAT ("user: text") and SYSTEM notices
+    
+    @staticmethod
+    def parse_command(message):
+        """Map input text to (frame_type, payload, echo); echo None means no local echo."""
+        command, _, rest = message.partition(" ")
+        if command == "/join" and rest:
+            return ROOM_JOIN, rest.strip(), None
+        if command == "/leave" and rest:
+            return ROOM_LEAVE, rest.strip(), None
+        if command in ("/room", "/msg"):
+            target, _, text = rest.partition(" ")
+            if target and text:
+                if command == "/room":
+                    return ROOM_CHAT, pack_target(target, text), f"[{target}] You: {text}"
+                return DIRECT, pack_target(target, text), f"[to {target}] {text}"
+        return CHAT, message, f"You: {message}"
+    
     def handle_disconnect(self, message):
         self.disconnect()
         messagebox.showinfo("Disconnected", message)
@@ -180,19 +241,38 @@ class ChatClient:
             return
 
         try:
-            # Prefix the message with 'You:' for the client's own messages
-            self.display_message(f"You: {message}")
-            self.client_socket.send(message.encode('utf-8'))
+            frame_type, payload, echo = self.parse_command(message)
+            # Echo the client's own messages locally (prefixed with 'You:')
+            if echo:
+                self.display_message(echo)
+            send_frame(self.client_socket, frame_type, payload)
             self.message_input.delete(0, tk.END)
-        except:
-            messagebox.showerror("Error", "Failed to send message")
+        except (OSError, ProtocolError) as e:  # ProtocolError: message over MAX_PAYLOAD
+            messagebox.showerror("Error", f"Failed to send message: {e}")
             self.disconnect()
     
     def display_message(self, message):
-        self.chat_display.config(state="normal")
-        self.chat_display.insert(tk.END, message + "\n")
-        self.chat_display.see(tk.END)
-        self.chat_display.config(state="disabled")
+        # Queued like received messages so the transcript keeps their order.
+        self.pending.append(message)
+    
+    def flush_messages(self):
+        """Write everything queued since the last frame in one widget update."""
+        lines = []
+        try:
+            while True:
+                lines.append(self.pending.popleft())
+        except IndexError:
+            pass
+        if lines:
+            self.chat_display.config(state="normal")
+            self.chat_display.insert(tk.END, "\n".join(lines) + "\n")
+            # Keep only the newest max_transcript_lines lines (the widget ends with an empty line).
+            excess = int(self.chat_display.index("end-1c").split(".")[0]) - 1 - self.max_transcript_lines
+            if excess > 0:
+                self.chat_display.delete("1.0", f"{excess + 1}.0")
+            self.chat_display.see(tk.END)
+            self.chat_display.config(state="disabled")
+        self.root.after(self.FRAME_INTERVAL_MS, self.flush_messages)
     
     def on_closing(self):
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
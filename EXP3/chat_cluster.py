@@ -0,0 +1,372 @@
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+
+from chat_core import ChatCore, Connection
+from chat_history import history_key
+from chat_protocol import (CHAT, DIRECT, HEADER, JOIN, LEAVE, MAX_PAYLOAD, ROOM_CHAT, ROOM_JOIN,
+                           ROOM_LEAVE, FrameReader, encode_frame)
+
+# Bus frames between the workers and the hub (same framing as the chat
+# protocol; types start at 101 so they can never be confused with chat frames).
+PUBLISH = 101        # worker <-> hub: a complete chat frame to fan out on every other worker
+CLAIM = 102          # worker -> hub: username
+CLAIMED = 103        # hub -> worker: "OK\nusername" or "TAKEN\nusername"
+RELEASE = 104        # worker -> hub: username
+ROUTE = 105          # worker -> hub: "recipient\nsender\n" + DIRECT frame
+DELIVER = 106        # hub -> worker: "recipient\n" + DIRECT frame
+UNDELIVERABLE = 107  # hub -> worker: "sender\nrecipient"
+
+# Frames that are relayed to the other workers (anything sent to every
+# client or to a room). Direct messages take the ROUTE path instead.
+SHARED_TYPES = frozenset((CHAT, JOIN, LEAVE, ROOM_CHAT, ROOM_JOIN, ROOM_LEAVE))
+ROOM_TYPES = frozenset((ROOM_CHAT, ROOM_JOIN, ROOM_LEAVE))
+BUS_MAX_PAYLOAD = MAX_PAYLOAD + 1024  # a chat frame plus routing prefix
+
+
+def _queue_bus_frame(link, bus_type, payload):
+    # Header and payload are queued separately so the chat frame inside is
+    # never copied; sendmsg() writes both in one call.
+    link.out.append(HEADER.pack(len(payload), bus_type))
+    link.out.append(payload)
+
+
+class ClusterChatCore(ChatCore):
+    """
+    ChatCore for one worker process of a cluster.
+
+    Each worker accepts clients on the shared port and serves them exactly
+    like a single-process server. Everything that has to be seen beyond the
+    worker goes over the bus socket to the hub: broadcast and room frames are
+    published to all other workers, which deliver them to their own clients
+    (room frames only to local members of that room), usernames are claimed
+    from the hub's global registry before USERNAME_OK is sent, and direct
+    messages for users on another worker are routed through the hub.
+    """
+
+    def __init__(self, *args, bus=None, **kwargs):
+        kwargs.setdefault('reuse_port', True)
+        super().__init__(*args, **kwargs)
+        self.bus_sock = bus
+        self._bus = None
+        self._claims = {}  # {username: Connection} waiting for the hub's answer
+
+    def start(self):
+        super().start()
+        self.bus_sock.setblocking(False)
+        self._bus = Connection(self.bus_sock, 'bus')
+        self._bus.reader = FrameReader(max_payload=BUS_MAX_PAYLOAD)
+        self._bus.handler = self._bus_event
+        self.selector.register(self.bus_sock, selectors.EVENT_READ, self._bus.handler)
+
+    def _to_bus(self, bus_type, payload):
+        # The bus queue is not bounded by max_queue_bytes: it is never evicted.
+        _queue_bus_frame(self._bus, bus_type, payload)
+        self._dirty.add(self._bus)
+
+    def _bus_event(self, key, events):
+        bus = self._bus
+        if events & selectors.EVENT_WRITE:
+            self._flush(bus)
+        if not events & selectors.EVENT_READ or bus.sock.fileno() == -1:
+            return
+        try:
+            received = bus.reader.recv_from(bus.sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            received = 0
+        if not received:
+            self._close(bus)
+            return
+        for bus_type, payload in bus.reader.frames():
+            if bus_type == PUBLISH:
+                self._deliver_remote(bytes(payload))
+            elif bus_type == CLAIMED:
+                result, _, username = str(payload, 'utf-8').partition('\n')
+                self._claim_result(username, result == 'OK')
+            elif bus_type == DELIVER:
+                recipient, _, frame = bytes(payload).partition(b'\n')
+                conn = self.clients.get(recipient.decode('utf-8'))
+                if conn is not None:
+                    self._send(conn, frame)
+            elif bus_type == UNDELIVERABLE:
+                sender, _, recipient = str(payload, 'utf-8').partition('\n')
+                conn = self.clients.get(sender)
+                if conn is not None:
+                    self._notice(conn, f"SERVER: {recipient} is not online")
+
+    def _deliver_remote(self, frame):
+        # A frame published by another worker: local delivery only.
+        frame_type = frame[HEADER.size - 1]
+        if frame_type in ROOM_TYPES:
+            for member in self.rooms.get(history_key(frame_type, frame), ()):
+                self._send(member, frame)
+        else:
+            self._deliver_all(frame)
+
+    def _record(self, frame_type, frame):
+        super()._record(frame_type, frame)
+        if frame_type in SHARED_TYPES:
+            self._to_bus(PUBLISH, frame)
+
+    def _handshake(self, conn, username):
+        if username in self._claims:
+            self._notice(conn, "USERNAME_TAKEN")
+            self._flush(conn)
+            self._close(conn)
+        elif not username or '\n' in username or username in self.clients:
+            super()._handshake(conn, username)  # rejected without asking the hub
+        else:
+            self._claims[username] = conn
+            self._to_bus(CLAIM, username.encode('utf-8'))
+
+    def _claim_result(self, username, granted):
+        conn = self._claims.pop(username, None)
+        if conn is None or conn.sock.fileno() == -1:
+            # The client went away while the claim was in flight.
+            if granted:
+                self._to_bus(RELEASE, username.encode('utf-8'))
+        elif granted:
+            super()._handshake(conn, username)
+        else:
+            self._notice(conn, "USERNAME_TAKEN")
+            self._flush(conn)
+            self._close(conn)
+
+    def send_direct(self, conn, recipient, text):
+        if recipient in self.clients:
+            super().send_direct(conn, recipient, text)
+            return
+        frame = encode_frame(DIRECT, f"{conn.username}\n{text}")
+        self._to_bus(ROUTE, f"{recipient}\n{conn.username}\n".encode('utf-8') + frame)
+
+    def _close(self, conn):
+        if conn is self._bus:
+            super()._close(conn)
+            self.on_log("Lost the cluster bus, shutting down")
+            self.running = False
+            return
+        username = conn.username
+        registered = username is not None and self.clients.get(username) is conn
+        super()._close(conn)
+        if registered:
+            self._to_bus(RELEASE, username.encode('utf-8'))
+
+
+class BusHub:
+    """
+    Relay between the worker processes (runs in the parent process).
+
+    Holds the global username registry and forwards PUBLISH frames to every
+    worker except the sender: each frame is copied out of the read buffer
+    once and that bytes object is queued for all workers. When a worker
+    dies its users are released and LEAVE notices are published for them.
+    """
+
+    def __init__(self, links, on_log=None):
+        self.on_log = on_log or (lambda text: None)
+        self.selector = selectors.DefaultSelector()
+        self.registry = {}  # {username: worker link}
+        self.owned = {}     # {worker link: set of usernames}
+        self.relayed = 0
+        self._dirty = set()
+        for worker_id, sock in enumerate(links):
+            sock.setblocking(False)
+            link = Connection(sock, worker_id)
+            link.reader = FrameReader(max_payload=BUS_MAX_PAYLOAD)
+            link.handler = self._make_handler(link)
+            self.owned[link] = set()
+            self.selector.register(sock, selectors.EVENT_READ, link.handler)
+
+    def serve_forever(self):
+        """Relay until every worker has disconnected."""
+        try:
+            while self.owned:
+                for key, events in self.selector.select():
+                    key.data(key, events)
+                self._flush_dirty()
+        finally:
+            for link in list(self.owned):
+                link.sock.close()
+            self.selector.close()
+
+    def _flush_dirty(self):
+        # A failed flush drops that worker, which queues LEAVE frames for the
+        # others, so repeat until nothing is left.
+        while self._dirty:
+            dirty, self._dirty = self._dirty, set()
+            for link in dirty:
+                if link in self.owned and not link.writing:
+                    self._flush(link)
+
+    def _make_handler(self, link):
+        def handle(key, events):
+            if events & selectors.EVENT_WRITE:
+                self._flush(link)
+            if events & selectors.EVENT_READ and link in self.owned:
+                self._read(link)
+        return handle
+
+    def _send(self, link, bus_type, payload):
+        _queue_bus_frame(link, bus_type, payload)
+        self._dirty.add(link)
+
+    def _read(self, link):
+        try:
+            received = link.reader.recv_from(link.sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            received = 0
+        if not received:
+            self._drop(link)
+            return
+        for bus_type, payload in link.reader.frames():
+            if bus_type == PUBLISH:
+                self._publish(bytes(payload), exclude=link)
+            elif bus_type == CLAIM:
+                username = str(payload, 'utf-8')
+                granted = username not in self.registry
+                if granted:
+                    self.registry[username] = link
+                    self.owned[link].add(username)
+                result = 'OK' if granted else 'TAKEN'
+                self._send(link, CLAIMED, f"{result}\n{username}".encode('utf-8'))
+            elif bus_type == RELEASE:
+                username = str(payload, 'utf-8')
+                if self.registry.get(username) is link:
+                    del self.registry[username]
+                    self.owned[link].discard(username)
+            elif bus_type == ROUTE:
+                recipient, sender, frame = bytes(payload).split(b'\n', 2)
+                owner = self.registry.get(recipient.decode('utf-8'))
+                if owner is None:
+                    self._send(link, UNDELIVERABLE, sender + b'\n' + recipient)
+                else:
+                    self._send(owner, DELIVER, recipient + b'\n' + frame)
+
+    def _publish(self, frame, exclude=None):
+        self.relayed += 1
+        for link in self.owned:
+            if link is not exclude:
+                self._send(link, PUBLISH, frame)
+
+    def _flush(self, link):
+        try:
+            done = link.out.flush(link.sock)
+        except OSError:
+            self._drop(link)
+            return
+        if done != (not link.writing):
+            link.writing = not done
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if link.writing else 0)
+            self.selector.modify(link.sock, events, link.handler)
+
+    def _drop(self, link):
+        if link not in self.owned:
+            return
+        self.selector.unregister(link.sock)
+        link.sock.close()
+        usernames = self.owned.pop(link)
+        self.on_log(f"Worker {link.addr} disconnected from the bus ({len(usernames)} users released)")
+        for username in usernames:
+            del self.registry[username]
+            self._publish(encode_frame(LEAVE, username))
+
+
+def reserve_port(host, port):
+    """
+    Bind (without listening) a SO_REUSEPORT socket to resolve port 0 to a
+    real port before the workers start; keep it open until they are bound.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def _worker_main(worker_id, bus, other_links, host, port, backlog, max_queue_bytes, verbose, ready):
+    for link in other_links:
+        link.close()  # the hub's ends, inherited through fork
+
+    def log(text):
+        # One write per line so output from several workers does not interleave.
+        sys.stdout.write(f"{time.strftime('%H:%M:%S')} [worker {worker_id}] {text}\n")
+        sys.stdout.flush()
+
+    core = ClusterChatCore(host, port, backlog, max_queue_bytes, on_log=log, bus=bus)
+    core.log_broadcasts = verbose
+    try:
+        core.start()
+    finally:
+        ready.release()
+    # ChatCore.stop() only queues a callback without taking a lock, so it is safe here.
+    signal.signal(signal.SIGTERM, lambda signum, frame: core.stop(notice="SERVER: Server is shutting down!"))
+    try:
+        core.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    log(f"stopped (evicted {core.evicted}, send errors {core.send_errors})")
+
+
+def run_cluster(host='127.0.0.1', port=9999, workers=None, backlog=1024, max_queue_bytes=1 << 20,
+                verbose=False, on_log=print, stop_timeout=5.0):
+    """
+    Serve the chat from `workers` forked processes (default: one per CPU)
+    sharing one port through SO_REUSEPORT; the calling process runs the bus
+    hub until all workers have exited (Ctrl+C or SIGTERM stops everything).
+    A worker still running `stop_timeout` seconds after the stop began is killed.
+    """
+    workers = workers or os.cpu_count() or 1
+    context = multiprocessing.get_context('fork')
+    reserved = reserve_port(host, port)
+    port = reserved.getsockname()[1]
+    ready = context.Semaphore(0)
+    pairs = [socket.socketpair() for _ in range(workers)]
+    hub_links = [hub_end for hub_end, _ in pairs]
+    processes = []
+    for worker_id, (_, worker_end) in enumerate(pairs):
+        process = context.Process(target=_worker_main, daemon=True,
+                                  args=(worker_id, worker_end, hub_links, host, port, backlog,
+                                        max_queue_bytes, verbose, ready))
+        process.start()
+        worker_end.close()
+        processes.append(process)
+    for _ in processes:
+        ready.acquire()
+    reserved.close()
+    on_log(f"Server started on {host}:{port} with {workers} worker processes")
+
+    hub = BusHub(hub_links, on_log=on_log)
+    stopping_since = []
+
+    def on_sigterm(signum, frame):
+        # Keep relaying while the workers say goodbye to their clients; the hub
+        # returns once all have exited, or the alarm takes the Ctrl+C path below.
+        for process in processes:
+            process.terminate()
+        stopping_since.append(time.monotonic())
+        signal.setitimer(signal.ITIMER_REAL, stop_timeout)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    signal.signal(signal.SIGALRM, signal.default_int_handler)
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    deadline = (stopping_since[0] if stopping_since else time.monotonic()) + stop_timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            on_log(f"Worker {process.pid} did not stop in {stop_timeout} s; killing it")
+            process.kill()
+            process.join()
+    on_log(f"Server stopped ({hub.relayed} frames relayed)")
@@ -0,0 +1,538 @@
+import collections
+import errno
+import selectors
+import socket
+import time
+
+from chat_protocol import (CHAT, DIRECT, JOIN, LEAVE, ROOM_CHAT, ROOM_JOIN, ROOM_LEAVE, SYSTEM,
+                           FrameQueue, FrameReader, ProtocolError, encode_frame, pack_target,
+                           unpack_target)
+from chat_history import GLOBAL
+from chat_metrics import LatencyHistogram, dumps as dump_stats
+
+
+def raise_fd_limit():
+    """Raise the soft open-file limit to the hard limit (one fd per client)."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class Connection:
+    """Per-client state owned by the event loop."""
+
+    __slots__ = ('sock', 'addr', 'username', 'rooms', 'reader', 'out', 'writing', 'handler',
+                 'messages_in', 'bytes_in', 'messages_out', 'bytes_out')
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.username = None  # set once the handshake succeeds
+        self.rooms = set()  # names of the rooms this client has joined
+        self.reader = FrameReader()
+        self.out = FrameQueue()
+        self.writing = False  # EVENT_WRITE registered
+        self.handler = None  # selector callback, see ChatCore._make_handler
+        self.messages_in = self.bytes_in = 0
+        self.messages_out = self.bytes_out = 0  # frames queued / bytes actually written
+
+
+class ChatCore:
+    """
+    Single-threaded networking core for the chat server.
+
+    One selectors loop handles accept, the username handshake, receives and
+    broadcasts for every client with non-blocking sockets, so there is no
+    thread per connection. All methods except start(), stop() and
+    call_soon_threadsafe() must be called from the loop thread (usually from
+    the callbacks below).
+
+    Clients speak the length-prefixed protocol in chat_protocol.py. Outgoing
+    frames are queued per connection and flushed once per loop iteration, so
+    everything a client is owed after one select() goes out in a single
+    sendmsg() call.
+
+    Besides the global chat, clients can join any number of rooms and send
+    direct messages. self.rooms maps a room name to the set of its member
+    connections and self.clients maps a username to its connection, so a
+    room message costs O(room size) and a direct message O(1), independent
+    of how many clients are connected in total. Empty rooms are dropped.
+
+    With a history (chat_history.MessageLog) every broadcast frame is also
+    appended to the on-disk log, and a client joining the chat or a room is
+    first sent that room's recent messages. The loop syncs the log in
+    batches and closes it when it exits.
+
+    Each client's outbound queue is bounded by max_queue_bytes: a client
+    that stops reading is evicted (disconnected) once its backlog would pass
+    the mark, instead of letting memory grow or slowing the fan-out to
+    everyone else. The evicted and send_errors counters record both cases.
+
+    Callbacks (all invoked on the loop thread):
+      on_log(text)              - human readable event
+      on_join(username, addr)   - handshake accepted
+      on_leave(username, addr)  - client gone
+
+    Set log_broadcasts = False to skip the per-message "Broadcasting: ..."
+    log lines, which dominate on_log traffic under load.
+
+    Metrics: the loop keeps global counters (accepted, messages_in/out,
+    bytes_in/out, evicted, send_errors, protocol_errors) and the same
+    per-connection byte/message counters, and with metrics=True also a
+    histogram of receive-to-fan-out latency: from the recv() that delivered a
+    chat, room or direct message to the end of the flush that wrote it to
+    the recipients. chat_metrics.snapshot() turns them into a dict;
+    serve_stats() exposes that as JSON over HTTP.
+    """
+
+    def __init__(self, host='127.0.0.1', port=9999, backlog=1024, max_queue_bytes=1 << 20,
+                 on_log=None, on_join=None, on_leave=None, history=None, reuse_port=False,
+                 metrics=True):
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.max_queue_bytes = max_queue_bytes
+        self.log_broadcasts = True
+        self.history = history
+        self.reuse_port = reuse_port  # share the port with other processes (SO_REUSEPORT)
+        self.on_log = on_log or (lambda text: None)
+        self.on_join = on_join or (lambda username, addr: None)
+        self.on_leave = on_leave or (lambda username, addr: None)
+        self.clients = {}  # {username: Connection}
+        self.rooms = {}    # {room: set of member Connections}
+        self.selector = None
+        self.server_socket = None
+        self.running = False
+        # No lock: deque append/popleft are atomic, and stop() may run in a
+        # signal handler on the loop thread while _run_pending is draining.
+        self._pending = collections.deque()
+        self._wakeup_r = self._wakeup_w = None
+        self._dirty = set()  # connections with frames queued since the last flush
+        self._slow = set()   # connections over max_queue_bytes, evicted before the next flush
+        self.evicted = 0      # slow consumers disconnected
+        self.send_errors = 0  # connections dropped because a send failed
+        self.accepted = self.protocol_errors = 0
+        self.messages_in = self.bytes_in = self.messages_out = self.bytes_out = 0
+        self.fanout_latency = LatencyHistogram() if metrics else None
+        self._fanout_pending = []  # (recv time ns, messages) awaiting the next flush
+        self.started_at = None
+        self.stats_socket = None
+
+    def start(self):
+        """Bind and listen. Raises OSError if the address is unavailable."""
+        raise_fd_limit()
+        self.selector = selectors.DefaultSelector()
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.backlog)
+        self.server_socket.setblocking(False)
+        self.port = self.server_socket.getsockname()[1]
+        self.selector.register(self.server_socket, selectors.EVENT_READ, self._accept)
+
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, self._run_pending)
+        self.running = True
+        self.started_at = time.monotonic()
+
+    def serve_forever(self):
+        """Run the event loop until stop() is called."""
+        try:
+            history = self.history
+            while self.running:
+                # Wake up in time to sync history that is waiting for its group commit.
+                timeout = history.sync_due() if history else None
+                for key, events in self.selector.select(timeout):
+                    key.data(key, events)
+                self._flush_dirty()
+                if self._fanout_pending:
+                    self._record_fanout_latency()
+                if history:
+                    history.maybe_sync()
+        finally:
+            self._shutdown()
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Run callback(*args) on the loop thread (safe from any thread and from signal handlers)."""
+        self._pending.append((callback, args))
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # a wakeup is already queued or the loop is gone
+
+    def stop(self, notice=None):
+        """Ask the loop to send an optional notice to everyone and exit."""
+        def _stop():
+            if notice:
+                self.broadcast(SYSTEM, notice)
+            self.running = False
+        self.call_soon_threadsafe(_stop)
+
+    def serve_stats(self, host='127.0.0.1', port=0):
+        """
+        Serve metrics snapshots on (host, port) from the loop thread: any HTTP
+        GET returns chat_metrics.snapshot() as JSON, with one entry per
+        client when the path contains "connections" (curl host:port/connections).
+        Call after start(); returns the bound port.
+        """
+        self.stats_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.stats_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.stats_socket.bind((host, port))
+        self.stats_socket.listen(16)
+        self.stats_socket.setblocking(False)
+        self.selector.register(self.stats_socket, selectors.EVENT_READ, self._accept_stats)
+        return self.stats_socket.getsockname()[1]
+
+    def _accept_stats(self, key, events):
+        try:
+            sock, _ = self.stats_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ, lambda key, events: self._answer_stats(sock))
+
+    def _answer_stats(self, sock):
+        try:
+            request = sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            request = b''
+        if not request:
+            self.selector.unregister(sock)
+            sock.close()
+            return
+        body = dump_stats(self, connections=b'connections' in request.split(b'\r\n', 1)[0]).encode('utf-8')
+        reply = memoryview(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n"
+                           b"Content-Length: %d\r\n\r\n" % len(body) + body)
+
+        # Never block the loop on a stats client: write what fits and wait
+        # for EVENT_WRITE for the rest, like the chat connections.
+        def write(key=None, events=None):
+            nonlocal reply
+            try:
+                reply = reply[sock.send(reply):]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                reply = reply[:0]
+            if reply:
+                self.selector.modify(sock, selectors.EVENT_WRITE, write)
+            else:
+                self.selector.unregister(sock)
+                sock.close()
+        write()
+
+    def _run_pending(self, key, events):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        pending = self._pending
+        for _ in range(len(pending)):  # not callbacks queued while these run
+            callback, args = pending.popleft()
+            callback(*args)
+
+    def _accept(self, key, events):
+        # Drain the accept queue; a burst of connects costs one wakeup.
+        while True:
+            try:
+                sock, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if e.errno in (errno.EMFILE, errno.ENFILE):
+                    self.on_log(f"Accept failed: {e}")
+                    return
+                raise
+            sock.setblocking(False)
+            # Writes are already batched per loop iteration; don't let Nagle delay them.
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(sock, addr)
+            self.accepted += 1
+            conn.handler = self._make_handler(conn)
+            self.selector.register(sock, selectors.EVENT_READ, conn.handler)
+
+    def _make_handler(self, conn):
+        def handle(key, events):
+            if events & selectors.EVENT_WRITE:
+                self._flush(conn)
+            if events & selectors.EVENT_READ and conn.sock.fileno() != -1:
+                self._read(conn)
+        return handle
+
+    def _read(self, conn):
+        try:
+            received = conn.reader.recv_from(conn.sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self.on_log(f"Error handling client {conn.addr}: {e}")
+            self._close(conn)
+            return
+        if not received:
+            self._close(conn)
+            return
+        received_ns = time.perf_counter_ns() if self.fanout_latency is not None else 0
+        conn.bytes_in += received
+        self.bytes_in += received
+        messages = fanouts = 0
+
+        try:
+            for frame_type, payload in conn.reader.frames():
+                messages += 1
+                text = str(payload, 'utf-8', 'replace')
+                if conn.username is None:
+                    if frame_type != JOIN:
+                        raise ProtocolError(f"expected JOIN, got frame type {frame_type}")
+                    self._handshake(conn, text)
+                elif frame_type == CHAT:
+                    fanouts += 1
+                    self.broadcast(CHAT, f"{conn.username}: {text}", exclude_username=conn.username)
+                elif frame_type == ROOM_CHAT:
+                    fanouts += 1
+                    room, message = unpack_target(text)
+                    self.send_to_room(conn, room, message)
+                elif frame_type == DIRECT:
+                    fanouts += 1
+                    recipient, message = unpack_target(text)
+                    self.send_direct(conn, recipient, message)
+                elif frame_type == ROOM_JOIN:
+                    self.join_room(conn, text)
+                elif frame_type == ROOM_LEAVE:
+                    self.leave_room(conn, text)
+                elif frame_type == LEAVE:
+                    self._close(conn)
+                else:
+                    raise ProtocolError(f"unexpected frame type {frame_type}")
+                if conn.sock.fileno() == -1:
+                    break
+        except ProtocolError as e:
+            self.protocol_errors += 1
+            self.on_log(f"Protocol error from {conn.addr}: {e}")
+            self._close(conn)
+        conn.messages_in += messages
+        self.messages_in += messages
+        if fanouts and received_ns:
+            self._fanout_pending.append((received_ns, fanouts))
+
+    def _record_fanout_latency(self):
+        now = time.perf_counter_ns()
+        record = self.fanout_latency.record
+        for received_ns, count in self._fanout_pending:
+            record(now - received_ns, count)
+        self._fanout_pending.clear()
+
+    def _handshake(self, conn, username):
+        if not username or '\n' in username:
+            self._send(conn, encode_frame(SYSTEM, "USERNAME_INVALID"))
+            self._flush(conn)
+            self._close(conn)
+            return
+        if username in self.clients:
+            self._send(conn, encode_frame(SYSTEM, "USERNAME_TAKEN"))
+            self._flush(conn)
+            self._close(conn)
+            return
+        self._send(conn, encode_frame(SYSTEM, "USERNAME_OK"))
+        conn.username = username
+        self.clients[username] = conn
+        self.on_log(f"New connection from {conn.addr} - Username: {username}")
+        self.on_join(username, conn.addr)
+        self._log_broadcast(f"SERVER: {username} has joined the chat!")
+        self.broadcast(JOIN, username, exclude_username=username, log=False)
+        self._replay(conn, GLOBAL)
+
+    def broadcast(self, frame_type, text, exclude_username=None, log=True):
+        """Queue one frame for every client except exclude_username."""
+        if log:
+            self._log_broadcast(text)
+        frame = encode_frame(frame_type, text)  # encoded once, shared by all queues
+        self._record(frame_type, frame)
+        self._deliver_all(frame, exclude_username)
+
+    def _deliver_all(self, frame, exclude_username=None):
+        for username, conn in self.clients.items():
+            if username != exclude_username:
+                self._send(conn, frame)
+
+    def _record(self, frame_type, frame):
+        # Every frame fanned out to all clients or to a room passes through
+        # here once (see chat_cluster.ClusterChatCore for the other user).
+        if self.history:
+            self.history.append(frame_type, frame)
+
+    def join_room(self, conn, room):
+        if not room or '\n' in room:
+            self._notice(conn, "SERVER: Invalid room name")
+            return
+        if room in conn.rooms:
+            return
+        members = self.rooms.setdefault(room, set())
+        members.add(conn)
+        conn.rooms.add(room)
+        # The joiner gets the notice too, as confirmation.
+        self._send_to_members(members, ROOM_JOIN, pack_target(room, conn.username))
+        self._replay(conn, room)
+
+    def leave_room(self, conn, room):
+        members = self.rooms.get(room)
+        if members is None or conn not in members:
+            return
+        self._send_to_members(members, ROOM_LEAVE, pack_target(room, conn.username))
+        self._remove_member(conn, room)
+
+    def _remove_member(self, conn, room):
+        members = self.rooms[room]
+        members.discard(conn)
+        conn.rooms.discard(room)
+        if not members:
+            del self.rooms[room]
+
+    def send_to_room(self, conn, room, text):
+        """Queue "username: text" for the other members of room (sender must be one)."""
+        if room not in conn.rooms:
+            self._notice(conn, f"SERVER: You are not in room {room}")
+            return
+        if self.log_broadcasts:
+            self.on_log(f"Broadcasting to {room}: {conn.username}: {text}")
+        frame = encode_frame(ROOM_CHAT, pack_target(room, f"{conn.username}: {text}"))
+        self._record(ROOM_CHAT, frame)
+        for member in self.rooms[room]:
+            if member is not conn:
+                self._send(member, frame)
+
+    def send_direct(self, conn, recipient, text):
+        """Queue a direct message for one user."""
+        target = self.clients.get(recipient)
+        if target is None:
+            self._notice(conn, f"SERVER: {recipient} is not online")
+            return
+        self._send(target, encode_frame(DIRECT, pack_target(conn.username, text)))
+
+    def _replay(self, conn, room):
+        # Recent history, newest first until half the queue limit is used so
+        # that a replay can never get the new client evicted.
+        if not self.history:
+            return
+        budget = self.max_queue_bytes // 2 - conn.out.nbytes
+        frames = []
+        for frame in reversed(self.history.recent_frames(room)):
+            budget -= len(frame)
+            if budget < 0:
+                break
+            frames.append(frame)
+        for frame in reversed(frames):
+            self._send(conn, frame)
+
+    def _send_to_members(self, members, frame_type, payload):
+        frame = encode_frame(frame_type, payload)
+        self._record(frame_type, frame)
+        for member in members:
+            self._send(member, frame)
+
+    def _notice(self, conn, text):
+        self._send(conn, encode_frame(SYSTEM, text))
+
+    def _log_broadcast(self, text):
+        if self.log_broadcasts:
+            self.on_log(f"Broadcasting: {text}")
+
+    def _send(self, conn, frame):
+        # Only queue here; _flush_dirty() writes after the current select batch.
+        # Eviction is deferred too, since callers may be iterating self.clients.
+        if conn in self._slow:
+            return
+        if conn.out.nbytes + len(frame) > self.max_queue_bytes:
+            self._slow.add(conn)
+            return
+        conn.out.append(frame)
+        conn.messages_out += 1
+        self.messages_out += 1
+        self._dirty.add(conn)
+
+    def _flush_dirty(self):
+        # Closing a client queues a LEAVE for the others, which can in turn
+        # push more of them over the mark, so repeat until nothing is left.
+        while self._slow or self._dirty:
+            slow, self._slow = self._slow, set()
+            for conn in slow:
+                self._evict(conn)
+            dirty, self._dirty = self._dirty, set()
+            for conn in dirty:
+                if not conn.writing:
+                    self._flush(conn)
+
+    def _flush(self, conn):
+        if conn.sock.fileno() == -1:
+            return
+        queued = conn.out.nbytes
+        try:
+            done = conn.out.flush(conn.sock)
+        except OSError as e:
+            self.send_errors += 1
+            self.on_log(f"Send to {conn.addr} failed: {e}")
+            self._close(conn)
+            return
+        written = queued - conn.out.nbytes
+        conn.bytes_out += written
+        self.bytes_out += written
+        if done != (not conn.writing):
+            # Watch for writability only while something is left over.
+            conn.writing = not done
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.writing else 0)
+            self.selector.modify(conn.sock, events, conn.handler)
+
+    def _evict(self, conn):
+        if conn.sock.fileno() == -1:
+            return
+        self.evicted += 1
+        self.on_log(f"Evicting slow client {conn.username or conn.addr}: "
+                    f"{conn.out.nbytes} bytes queued (limit {self.max_queue_bytes})")
+        self._close(conn)
+
+    def _close(self, conn):
+        if conn.sock.fileno() == -1:
+            return
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+        # Members learn about the departure from the global LEAVE frame.
+        for room in list(conn.rooms):
+            self._remove_member(conn, room)
+        username = conn.username
+        if username is not None and self.clients.get(username) is conn:
+            del self.clients[username]
+            self._log_broadcast(f"SERVER: {username} has left the chat!")
+            self.broadcast(LEAVE, username, exclude_username=username, log=False)
+            self.on_log(f"Connection closed: {conn.addr} - Username: {username}")
+            self.on_leave(username, conn.addr)
+
+    def _shutdown(self):
+        for conn in list(self.clients.values()):
+            # Best effort: push out what is still queued (e.g. the shutdown notice).
+            if conn.out.nbytes and conn.sock.fileno() != -1:
+                try:
+                    conn.out.flush(conn.sock)
+                except OSError:
+                    pass
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+        self._wakeup_w.close()
+        if self.history:
+            self.history.close()
+        self.clients = {}
+        self.rooms = {}
+        self.running = False
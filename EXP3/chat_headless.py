@@ -0,0 +1,108 @@
+import argparse
+import signal
+import sys
+import threading
+import time
+
+from chat_core import ChatCore
+from chat_history import MessageLog
+from chat_metrics import dumps as dump_stats
+
+
+def log_line(text):
+    print(f"{time.strftime('%H:%M:%S')} {text}", flush=True)
+
+
+class HeadlessChatServer:
+    """
+    Chat server without a GUI: runs the ChatCore event loop on the main
+    thread and writes events to stdout. Nothing here imports tkinter, so it
+    runs on machines without a display or Tk installed.
+    """
+
+    def __init__(self, host='127.0.0.1', port=9999, backlog=1024, max_queue_bytes=1 << 20,
+                 verbose=False, history_dir=None, replay=50, stats_port=None, stats_file=None,
+                 stats_interval=10.0, metrics=True):
+        history = MessageLog(history_dir, replay=replay) if history_dir else None
+        self.core = ChatCore(host, port, backlog, max_queue_bytes, on_log=self.log_message,
+                             history=history, metrics=metrics)
+        # Per-message broadcast lines would make stdout the bottleneck under load.
+        self.core.log_broadcasts = verbose
+        self.stats_port = stats_port
+        self.stats_file = stats_file
+        self.stats_interval = stats_interval
+
+    def log_message(self, message):
+        log_line(message)
+
+    def run(self):
+        self.core.start()
+        self.log_message(f"Server started on {self.core.host}:{self.core.port}")
+        if self.stats_port is not None:
+            port = self.core.serve_stats(self.core.host, self.stats_port)
+            self.log_message(f"Stats on http://{self.core.host}:{port}/ (per client: /connections)")
+        if self.stats_file:
+            threading.Thread(target=self.stats_timer, daemon=True).start()
+        # SIGTERM stops the loop the same way Ctrl+C does (stop() is safe in a signal handler).
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        try:
+            self.core.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        self.log_message(f"Server stopped (evicted {self.core.evicted}, send errors {self.core.send_errors})")
+
+    def stats_timer(self):
+        # The snapshot itself is taken on the loop thread.
+        while self.core.running:
+            time.sleep(self.stats_interval)
+            self.core.call_soon_threadsafe(self.write_stats)
+
+    def write_stats(self):
+        with open(self.stats_file, 'a') as f:
+            f.write(dump_stats(self.core) + "\n")
+
+    def stop(self):
+        self.core.stop(notice="SERVER: Server is shutting down!")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the chat server without the Tk GUI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--max-queue-bytes", type=int, default=1 << 20,
+                        help="evict clients whose unsent backlog would exceed this")
+    parser.add_argument("--verbose", action="store_true", help="also log every broadcast message")
+    parser.add_argument("--history", metavar="DIR", help="persist messages in DIR and replay them on join")
+    parser.add_argument("--replay", type=int, default=50, help="messages replayed per room on join")
+    parser.add_argument("--stats-port", type=int, help="serve JSON metrics over HTTP on this port (0 = any)")
+    parser.add_argument("--stats-file", metavar="PATH", help="append a JSON metrics snapshot to PATH periodically")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="seconds between --stats-file snapshots")
+    parser.add_argument("--no-metrics", action="store_true", help="do not time receive-to-fan-out latency")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the port via SO_REUSEPORT (0 = one per CPU)")
+    args = parser.parse_args(argv)
+    if args.workers != 1 and (args.history or args.stats_port is not None or args.stats_file):
+        parser.error("--history and --stats-* are only supported with a single worker")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.workers != 1:
+        from chat_cluster import run_cluster
+        try:
+            run_cluster(args.host, args.port, args.workers or None, args.backlog,
+                        args.max_queue_bytes, args.verbose, on_log=log_line)
+        except OSError as e:
+            print(f"Server error: {e}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+    server = HeadlessChatServer(args.host, args.port, args.backlog, args.max_queue_bytes, args.verbose,
+                                args.history, args.replay, args.stats_port, args.stats_file,
+                                args.stats_interval, not args.no_metrics)
+    try:
+        server.run()
+    except OSError as e:
+        print(f"Server error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,188 @@
+import mmap
+import os
+import struct
+import time
+from collections import deque
+
+from chat_protocol import (CHAT, HEADER, JOIN, LEAVE, MAX_PAYLOAD, ROOM_CHAT, ROOM_JOIN,
+                           ROOM_LEAVE)
+
+# Segment layout: records are packed back to back from offset 0,
+#   uint64 timestamp (ns since the epoch, big-endian) | frame (chat_protocol HEADER + payload)
+# The unused tail of a segment is zero-filled, so a zero timestamp marks the end
+# of the data. A segment is named after the log offset of its first byte.
+RECORD = struct.Struct('!Q')
+SEGMENT_SUFFIX = '.log'
+LOGGED_TYPES = frozenset((CHAT, JOIN, LEAVE, ROOM_CHAT, ROOM_JOIN, ROOM_LEAVE))
+REPLAY_TYPES = frozenset((CHAT, ROOM_CHAT))
+GLOBAL = ''  # history key of the global chat; room names are never empty
+
+
+def history_key(frame_type, frame):
+    """Room a broadcast frame belongs to (GLOBAL for the global chat)."""
+    if frame_type in (ROOM_CHAT, ROOM_JOIN, ROOM_LEAVE):
+        end = frame.index(b'\n', HEADER.size)
+        return str(frame[HEADER.size:end], 'utf-8', 'replace')
+    return GLOBAL
+
+
+class MessageLog:
+    """
+    Append-only chat history in memory-mapped segment files, plus a ring of
+    the last `replay` chat frames per room for replay on join.
+
+    append() only copies the frame into the mapped segment; the data reaches
+    the disk when sync() runs, which the event loop does at most every
+    sync_interval seconds (or once sync_bytes are pending). One msync()
+    therefore commits every message of that window: a crash loses at most
+    sync_interval seconds of history, and durability does not cost a
+    syscall per message.
+
+    The rings hold the exact frame objects that were broadcast, so replay
+    queues the same bytes again without copying or re-encoding.
+    """
+
+    def __init__(self, directory, replay=50, segment_bytes=64 << 20, max_segments=None,
+                 sync_interval=0.05, sync_bytes=1 << 20):
+        if segment_bytes < RECORD.size + HEADER.size + MAX_PAYLOAD:
+            raise ValueError(f"segment_bytes must hold one maximal frame ({MAX_PAYLOAD} bytes)")
+        self.directory = directory
+        self.replay = replay
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.sync_interval = sync_interval
+        self.sync_bytes = sync_bytes
+        self.recent = {}  # {room: deque of frames}
+        self.appended = 0
+        self.syncs = 0
+        self._file = self._mmap = None
+        self._base = 0      # log offset of the open segment
+        self._pos = 0       # write position inside the open segment
+        self._synced = 0    # segment position up to which data has been synced
+        self._dirty_since = None
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def segments(self):
+        """Segment paths, oldest first."""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _recover(self):
+        paths = self.segments()
+        for path in paths:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    for frame_type, frame in self._scan(data)[0]:
+                        if frame_type in REPLAY_TYPES:
+                            self._remember(frame_type, frame)
+        if paths:
+            self._base = int(os.path.basename(paths[-1])[:-len(SEGMENT_SUFFIX)])
+            self._open_segment(paths[-1])
+        else:
+            self._open_segment(self._segment_path(0))
+
+    def _scan(self, data):
+        """Records in a mapped segment: ([(frame_type, frame bytes)], end position)."""
+        records = []
+        pos = 0
+        limit = len(data) - RECORD.size - HEADER.size
+        while pos <= limit:
+            timestamp, = RECORD.unpack_from(data, pos)
+            if not timestamp:
+                break
+            length, frame_type = HEADER.unpack_from(data, pos + RECORD.size)
+            end = pos + RECORD.size + HEADER.size + length
+            if end > len(data):
+                break  # torn record at the tail
+            records.append((frame_type, data[pos + RECORD.size:end]))
+            pos = end
+        return records, pos
+
+    def _segment_path(self, base):
+        return os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}")
+
+    def _open_segment(self, path):
+        self._file = open(path, 'a+b')
+        fd = self._file.fileno()
+        size = os.fstat(fd).st_size
+        if size < self.segment_bytes:
+            os.ftruncate(fd, self.segment_bytes)  # sparse zero fill
+        self._mmap = mmap.mmap(fd, max(size, self.segment_bytes))
+        self._pos = self._scan(self._mmap)[1] if size else 0
+        self._synced = self._pos
+
+    def _close_segment(self):
+        self.sync()
+        self._mmap.close()
+        # Trim the zero tail so a finished segment is exactly its records.
+        os.ftruncate(self._file.fileno(), self._pos)
+        self._file.close()
+        self._file = self._mmap = None
+
+    def _rotate(self):
+        self._close_segment()
+        self._base += self._pos
+        self._open_segment(self._segment_path(self._base))
+        if self.max_segments:
+            for path in self.segments()[:-self.max_segments]:
+                os.remove(path)
+
+    def append(self, frame_type, frame):
+        """Record one broadcast frame (as produced by encode_frame)."""
+        if frame_type not in LOGGED_TYPES:
+            return
+        size = RECORD.size + len(frame)
+        if self._pos + size > len(self._mmap):
+            self._rotate()
+        pos = self._pos
+        # Payload first, timestamp last: a record only counts once its
+        # timestamp is non-zero.
+        self._mmap[pos + RECORD.size:pos + size] = frame
+        RECORD.pack_into(self._mmap, pos, time.time_ns())
+        self._pos = pos + size
+        self.appended += 1
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        if frame_type in REPLAY_TYPES:
+            self._remember(frame_type, frame)
+
+    def _remember(self, frame_type, frame):
+        key = history_key(frame_type, frame)
+        ring = self.recent.get(key)
+        if ring is None:
+            ring = self.recent[key] = deque(maxlen=self.replay)
+        ring.append(frame)
+
+    def recent_frames(self, room=GLOBAL):
+        """The last `replay` chat frames of room, oldest first."""
+        return self.recent.get(room, ())
+
+    def sync_due(self):
+        """Seconds until pending data must be synced (None if nothing is pending)."""
+        if self._dirty_since is None:
+            return None
+        if self._pos - self._synced >= self.sync_bytes:
+            return 0.0
+        return max(0.0, self._dirty_since + self.sync_interval - time.monotonic())
+
+    def maybe_sync(self):
+        due = self.sync_due()
+        if due is not None and due <= 0:
+            self.sync()
+
+    def sync(self):
+        """Flush everything appended so far to disk (one msync)."""
+        if self._dirty_since is None:
+            return
+        start = self._synced - self._synced % mmap.ALLOCATIONGRANULARITY
+        self._mmap.flush(start, self._pos - start)
+        self._synced = self._pos
+        self._dirty_since = None
+        self.syncs += 1
+
+    def close(self):
+        if self._mmap is not None:
+            self._close_segment()
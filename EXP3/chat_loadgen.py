@@ -0,0 +1,282 @@
+import argparse
+import json
+import os
+import platform
+import selectors
+import socket
+import subprocess
+import sys
+import time
+
+from chat_core import raise_fd_limit
+from chat_protocol import CHAT, JOIN, FrameReader, encode_frame, send_frame
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port(host='127.0.0.1'):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(host, port, workers=1, extra_args=()):
+    """Start chat_headless.py in a subprocess and wait until it accepts connections."""
+    command = [sys.executable, os.path.join(HERE, 'chat_headless.py'),
+               '--host', host, '--port', str(port), '--workers', str(workers), *extra_args]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("chat server did not start")
+            time.sleep(0.05)
+
+
+def process_tree(pid):
+    """pid and all its descendants (Linux /proc)."""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def rss_bytes(pid):
+    """Resident set size of pid plus its children (e.g. cluster workers), or None."""
+    total = 0
+    for current in process_tree(pid):
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            if current == pid:
+                return None
+    return total
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class SimClient:
+    __slots__ = ('name', 'sock', 'reader', 'outbox', 'outbox_ns')
+
+    def __init__(self, name, sock):
+        self.name = name
+        self.sock = sock
+        self.reader = FrameReader()
+        self.outbox = bytearray()  # rest of a partially sent frame
+        self.outbox_ns = None  # send time carried by that frame
+
+
+def connect_clients(host, port, count, prefix='load'):
+    """Open count connections and complete the USERNAME_OK handshake for each."""
+    clients = []
+    for i in range(count):
+        sock = socket.create_connection((host, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = SimClient(f"{prefix}{i}", sock)
+        send_frame(sock, JOIN, client.name)
+        clients.append(client)
+    for client in clients:
+        frame = client.reader.next_frame(client.sock)
+        if frame is None or bytes(frame[1]) != b'USERNAME_OK':
+            raise RuntimeError(f"handshake failed for {client.name}")
+        client.sock.setblocking(False)
+    return clients
+
+
+def run_load(host, port, clients=100, senders=10, rate=200.0, duration=10.0, payload=64,
+             warmup=1.0, drain=2.0, server_pid=None):
+    """
+    Drive a running chat server and return a result record.
+
+    `senders` of the clients send CHAT messages at `rate` messages/second in
+    total (round robin); every message carries its send time, and each other
+    client that receives it records send-to-receive latency. Messages sent
+    during the first `warmup` seconds are delivered but not measured; after
+    `duration` seconds sending stops and the run waits up to `drain` seconds
+    for the rest to arrive. All clients live in this process (one selectors
+    loop), so the clock is shared. A message counts as sent once its whole
+    frame is written; a sender whose socket is full (or that still has part
+    of a frame to write) skips its turn, which is counted in send_blocked.
+    """
+    raise_fd_limit()
+    sims = connect_clients(host, port, clients)
+    selector = selectors.DefaultSelector()
+    for sim in sims:
+        selector.register(sim.sock, selectors.EVENT_READ, sim)
+    padding = 'x' * max(0, payload - 24)
+    interval = 1.0 / rate
+    latencies = []
+    sent = measured_sent = delivered = send_blocked = turn = 0
+    rss_peak = rss_bytes(server_pid) if server_pid else None
+
+    start = time.perf_counter()
+    measure_from = start + warmup
+    measure_from_ns = int(measure_from * 1e9)
+    stop_sending = measure_from + duration
+    end = stop_sending + drain
+    next_send = start
+    next_rss = start + 1.0
+    expected = 0  # deliveries of measured messages
+
+    def written(sent_ns):
+        nonlocal sent, measured_sent, expected
+        if sent_ns >= measure_from_ns:
+            measured_sent += 1
+            expected += clients - 1
+        sent += 1
+
+    while True:
+        now = time.perf_counter()
+        sending = now < stop_sending
+        if not sending and delivered >= expected:
+            break
+        if now >= end:
+            break
+        while sending and next_send <= now:
+            sender = sims[turn % senders]
+            turn += 1
+            next_send += interval
+            if sender.outbox:
+                send_blocked += 1
+                continue
+            sent_ns = time.perf_counter_ns()
+            frame = encode_frame(CHAT, f"{sent_ns} {padding}")
+            try:
+                n = sender.sock.send(frame)
+            except BlockingIOError:
+                send_blocked += 1
+                continue
+            if n == len(frame):
+                written(sent_ns)
+            else:
+                sender.outbox += frame[n:]
+                sender.outbox_ns = sent_ns
+                selector.modify(sender.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, sender)
+        if server_pid and now >= next_rss:
+            rss = rss_bytes(server_pid)
+            if rss is not None:
+                rss_peak = max(rss_peak or 0, rss)
+            next_rss = now + 1.0
+        timeout = max(0.0, min(next_send if sending else end, next_rss if server_pid else end) - now)
+        for key, events in selector.select(timeout):
+            sim = key.data
+            if events & selectors.EVENT_WRITE:
+                try:
+                    del sim.outbox[:sim.sock.send(sim.outbox)]
+                except BlockingIOError:
+                    pass
+                if not sim.outbox:
+                    written(sim.outbox_ns)
+                    selector.modify(sim.sock, selectors.EVENT_READ, sim)
+            if not events & selectors.EVENT_READ:
+                continue
+            try:
+                if not sim.reader.recv_from(sim.sock):
+                    raise RuntimeError(f"server closed the connection of {sim.name}")
+            except BlockingIOError:
+                continue
+            received_ns = time.perf_counter_ns()
+            for frame_type, body in sim.reader.frames():
+                if frame_type != CHAT:
+                    continue
+                # body is "loadN: <send time ns> <padding>"
+                text = bytes(body[:64]).split(b' ', 2)
+                sent_ns = int(text[1])
+                if sent_ns >= measure_from_ns:
+                    delivered += 1
+                    latencies.append(received_ns - sent_ns)
+    elapsed = time.perf_counter() - measure_from
+
+    for sim in sims:
+        selector.unregister(sim.sock)
+        sim.sock.close()
+    selector.close()
+    latencies.sort()
+    ms = lambda ns: ns / 1e6 if ns is not None else None
+    return {
+        'clients': clients,
+        'senders': senders,
+        'rate': rate,
+        'payload': payload,
+        'duration': duration,
+        'sent': measured_sent,
+        'send_blocked': send_blocked,
+        'delivered': delivered,
+        'expected': expected,
+        'sent_per_sec': measured_sent / duration,
+        'delivered_per_sec': delivered / elapsed if elapsed > 0 else None,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 0.50)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'p999': ms(percentile(latencies, 0.999)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+        'server_rss_bytes': rss_peak,
+        'python': platform.python_version(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the chat server and report latency as JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="use a running server instead of spawning chat_headless.py")
+    parser.add_argument("--server-pid", type=int, help="pid of the running server, for RSS")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1],
+                        help="spawned server backends to compare: 1 = single process, N = N workers")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--senders", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=200.0, help="total messages per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--payload", type=int, default=64, help="approximate message size in bytes")
+    parser.add_argument("--server-args", default="", help="extra chat_headless.py arguments, e.g. --server-args=--no-metrics")
+    parser.add_argument("--out", metavar="PATH", help="append JSON lines to PATH instead of stdout")
+    args = parser.parse_args()
+    if args.senders > args.clients:
+        parser.error("--senders cannot exceed --clients")
+
+    load = dict(clients=args.clients, senders=args.senders, rate=args.rate, duration=args.duration,
+                payload=args.payload, warmup=args.warmup)
+    out = open(args.out, "a") if args.out else sys.stdout
+    try:
+        if args.port:
+            record = run_load(args.host, args.port, server_pid=args.server_pid, **load)
+            record['server'] = 'external'
+            out.write(json.dumps(record) + "\n")
+            return
+        for workers in args.workers:
+            port = free_port(args.host)
+            server = spawn_server(args.host, port, workers, args.server_args.split())
+            try:
+                record = run_load(args.host, port, server_pid=server.pid, **load)
+            finally:
+                server.terminate()
+                server.wait()
+            record['server'] = 'single' if workers == 1 else 'cluster'
+            record['workers'] = workers
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import json
+import time
+
+SUB_BUCKET_BITS = 5  # 32 sub-buckets per power of two: values are kept within ~3%
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of non-negative integers (nanoseconds here).
+
+    Values below 2 * 2**SUB_BUCKET_BITS get a bucket each; above that every
+    power of two is split into 2**SUB_BUCKET_BITS equal buckets, so the
+    relative error is bounded while the bucket count only grows with the
+    logarithm of the largest value. record() is a few integer operations and
+    a list increment, cheap enough for the per-message path.
+    """
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value):
+        linear = 2 << SUB_BUCKET_BITS
+        if value < linear:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return linear + ((shift - 1) << SUB_BUCKET_BITS) + (value >> shift) - (1 << SUB_BUCKET_BITS)
+
+    @staticmethod
+    def _lowest(index):
+        linear = 2 << SUB_BUCKET_BITS
+        if index < linear:
+            return index
+        shift, top = divmod(index - linear, 1 << SUB_BUCKET_BITS)
+        return (top + (1 << SUB_BUCKET_BITS)) << (shift + 1)
+
+    def record(self, value, count=1):
+        index = self._index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        """Smallest bucket bound covering fraction of the values (None if empty)."""
+        if not self.count:
+            return None
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._lowest(index + 1) - 1, self.max)
+        return self.max
+
+    def summary(self, scale=1e-3):
+        """count, min, mean, percentiles and max, multiplied by scale (ns -> us by default)."""
+        if not self.count:
+            return {'count': 0}
+        result = {'count': self.count, 'min': round(self.min * scale, 3),
+                  'mean': round(self.total / self.count * scale, 3)}
+        for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999)):
+            result[name] = round(self.percentile(fraction) * scale, 3)
+        result['max'] = round(self.max * scale, 3)
+        return result
+
+
+COUNTERS = ('accepted', 'messages_in', 'bytes_in', 'messages_out', 'bytes_out', 'evicted',
+            'send_errors', 'protocol_errors')
+
+
+def snapshot(core, connections=False):
+    """
+    Machine-readable state of a ChatCore: global counters, queue depth,
+    receive-to-fan-out latency and optionally one entry per connection.
+    Must run on the loop thread (e.g. via call_soon_threadsafe).
+    """
+    queued_frames = queued_bytes = max_queued = 0
+    for conn in core.clients.values():
+        queued_frames += len(conn.out)
+        queued_bytes += conn.out.nbytes
+        max_queued = max(max_queued, conn.out.nbytes)
+    result = {
+        'time': time.time(),
+        'uptime': time.monotonic() - core.started_at if core.started_at else 0.0,
+        'clients': len(core.clients),
+        'rooms': len(core.rooms),
+        'counters': {name: getattr(core, name) for name in COUNTERS},
+        'queue': {'frames': queued_frames, 'bytes': queued_bytes, 'max_client_bytes': max_queued},
+    }
+    if core.fanout_latency is not None:
+        result['fanout_latency_us'] = core.fanout_latency.summary()
+    if connections:
+        result['connections'] = [
+            {'username': username, 'addr': f"{conn.addr[0]}:{conn.addr[1]}",
+             'messages_in': conn.messages_in, 'bytes_in': conn.bytes_in,
+             'messages_out': conn.messages_out, 'bytes_out': conn.bytes_out,
+             'queued_frames': len(conn.out), 'queued_bytes': conn.out.nbytes}
+            for username, conn in core.clients.items()
+        ]
+    return result
+
+
+def dumps(core, connections=False):
+    return json.dumps(snapshot(core, connections))
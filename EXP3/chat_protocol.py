@@ -0,0 +1,181 @@
+import os
+import socket
+import struct
+from collections import deque
+from itertools import islice
+
+# Wire format: every frame is a 5-byte header followed by the payload.
+#   uint32 payload length (big-endian) | uint8 frame type | payload (UTF-8 text)
+HEADER = struct.Struct('!IB')
+
+# Frame types
+JOIN = 1     # client -> server: requested username; server -> clients: username joined
+LEAVE = 2    # client -> server: goodbye; server -> clients: username left
+CHAT = 3     # client -> server: message text; server -> clients: "username: text"
+SYSTEM = 4   # server -> client: USERNAME_OK / USERNAME_TAKEN / USERNAME_INVALID / notices
+# Rooms and direct messages. Addressed payloads are "<target>\n<text>", see
+# pack_target(); room names and usernames therefore cannot contain a newline.
+ROOM_JOIN = 5   # client -> server: room; server -> room members: "room\nusername"
+ROOM_LEAVE = 6  # client -> server: room; server -> room members: "room\nusername"
+ROOM_CHAT = 7   # client -> server: "room\ntext"; server -> room members: "room\nusername: text"
+DIRECT = 8      # client -> server: "recipient\ntext"; server -> recipient: "sender\ntext"
+
+MAX_PAYLOAD = 1 << 20
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(frame_type, payload):
+    """Build one frame; payload is str (encoded as UTF-8) or bytes."""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    return HEADER.pack(len(payload), frame_type) + payload
+
+
+def pack_target(target, text=''):
+    """Payload for an addressed frame (room or username plus text)."""
+    return f"{target}\n{text}"
+
+
+def unpack_target(payload):
+    """Inverse of pack_target(); payload is str. Raises ProtocolError if unaddressed."""
+    target, sep, text = payload.partition('\n')
+    if not sep or not target:
+        raise ProtocolError("addressed frame without a target")
+    return target, text
+
+
+class FrameReader:
+    """
+    Reassembles frames from a stream socket into one reusable buffer.
+
+    recv_from() reads with recv_into() straight into the free tail of the
+    buffer, and frames() yields (frame_type, payload) where payload is a
+    memoryview into that buffer: it is only valid until the next recv_from()
+    call, so decode or copy it before reading again. The buffer is compacted
+    in place and only grows when a single frame does not fit.
+    """
+
+    def __init__(self, capacity=65536, max_payload=MAX_PAYLOAD):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.max_payload = max_payload
+
+    def recv_from(self, sock):
+        """One recv_into(); returns the byte count (0 = peer closed)."""
+        if self.end == len(self.buffer):
+            self._make_room()
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def frames(self):
+        buffer = self.buffer
+        while self.end - self.start >= HEADER.size:
+            length, frame_type = HEADER.unpack_from(buffer, self.start)
+            if length > self.max_payload:
+                raise ProtocolError(f"frame of {length} bytes exceeds {self.max_payload}")
+            frame_end = self.start + HEADER.size + length
+            if frame_end > self.end:
+                if frame_end - self.start > len(buffer):
+                    self._make_room(HEADER.size + length)
+                break
+            payload = self.view[self.start + HEADER.size:frame_end]
+            self.start = frame_end
+            yield frame_type, payload
+        if self.start == self.end:
+            self.start = self.end = 0
+
+    def next_frame(self, sock):
+        """Blocking helper: return the next (frame_type, payload) or None on EOF."""
+        while True:
+            for frame in self.frames():
+                return frame
+            if not self.recv_from(sock):
+                return None
+
+    def _make_room(self, needed=0):
+        pending = self.end - self.start
+        if max(needed, pending + 1) > len(self.buffer):
+            grown = bytearray(max(needed, 2 * len(self.buffer)))
+            grown[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer = grown
+            self.view = memoryview(grown)
+        elif self.start:
+            self.buffer[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+
+class FrameQueue:
+    """
+    Outbound frames for one non-blocking socket.
+
+    Frames are queued as-is (no copying or concatenation) and flush() hands
+    up to IOV_MAX of them to a single sendmsg() call (writev), so a burst of
+    frames for the same client costs one syscall.
+    """
+
+    def __init__(self):
+        self.frames = deque()
+        self.offset = 0   # bytes of frames[0] already sent
+        self.nbytes = 0   # bytes still queued
+
+    def __len__(self):
+        return len(self.frames)
+
+    def append(self, frame):
+        self.frames.append(frame)
+        self.nbytes += len(frame)
+
+    def flush(self, sock):
+        """
+        Send as much as the socket takes without blocking.
+        Returns True when the queue is empty. Socket errors other than
+        BlockingIOError propagate to the caller.
+        """
+        frames = self.frames
+        while frames:
+            batch = list(islice(frames, IOV_MAX))
+            if self.offset:
+                batch[0] = memoryview(batch[0])[self.offset:]
+            try:
+                if _HAS_SENDMSG:
+                    sent = sock.sendmsg(batch)
+                else:
+                    sent = sock.send(b''.join(batch))
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.nbytes -= sent
+            short_write = sent < sum(len(part) for part in batch)
+            while sent:
+                head = len(frames[0]) - self.offset
+                if sent < head:
+                    self.offset += sent
+                    break
+                sent -= head
+                frames.popleft()
+                self.offset = 0
+            if short_write:
+                return False  # kernel send buffer is full; wait for writability
+        return True
+
+
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+
+def send_frame(sock, frame_type, payload):
+    """Blocking send of one frame (client side)."""
+    sock.sendall(encode_frame(frame_type, payload))
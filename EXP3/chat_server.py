@@ -1,14 +1,28 @@
-import socket
+import queue
 import threading
 import tkinter as tk
+from collections import deque
 from tkinter import scrolledtext, messagebox
 
+from chat_core import ChatCore
+from chat_history import MessageLog
+
 class ChatServer:
-    def __init__(self, host='127.0.0.1', port=9999):
+    # The network thread never touches Tk: it posts events to self.events and
+    # the Tk thread applies them in batches every UI_INTERVAL_MS.
+    UI_INTERVAL_MS = 100
+
+    def __init__(self, host='127.0.0.1', port=9999, backlog=1024, max_queue_bytes=1 << 20,
+                 max_log_lines=1000, history_dir=None):
         self.host = host
         self.port = port
-        self.server_socket = None
-        self.clients = {}  # {username: (connection, address)}
+        self.backlog = backlog
+        self.max_queue_bytes = max_queue_bytes
+        self.max_log_lines = max_log_lines  # older log lines are dropped (ring buffer)
+        self.history_dir = history_dir  # persist and replay chat history when set
+        self.core = None  # ChatCore event loop, running in self.server_thread
+        self.events = queue.SimpleQueue()
+        self.client_rows = []  # usernames in the order shown in clients_area
         
         # Set up GUI
         self.root = tk.Tk()
@@ -44,8 +58,25 @@ class ChatServer:
         tk.Label(self.clients_frame, text="Connected Clients:").pack(anchor="w")
         self.clients_area = scrolledtext.ScrolledText(self.clients_frame, state="disabled", height=5)
         self.clients_area.pack(fill="both", expand=True, padx=5, pady=5)
+        
+        self.root.after(self.UI_INTERVAL_MS, self.process_events)
 
     def start_server(self):
+        # The core closes the history when its loop exits.
+        history = MessageLog(self.history_dir) if self.history_dir else None
+        self.core = ChatCore(self.host, self.port, self.backlog, self.max_queue_bytes,
+                             on_log=self.log_message,
+                             on_join=lambda username, addr: self.events.put(('join', username, addr)),
+                             on_leave=lambda username, addr: self.events.put(('leave', username, addr)),
+                             history=history)
+        try:
+            self.core.start()
+        except OSError as e:
+            self.log_message(f"Server error: {str(e)}")
+            if history:
+                history.close()
+            self.core = None
+            return
         self.server_thread = threading.Thread(target=self.server_loop)
         self.server_thread.daemon = True
         self.server_thread.start()
@@ -55,143 +86,78 @@ class ChatServer:
         self.log_message("Server started on {}:{}".format(self.host, self.port))
     
     def server_loop(self):
+        # A single thread runs the event loop for every client connection.
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
-            
-            while True:
-                client_socket, client_address = self.server_socket.accept()
-                client_thread = threading.Thread(target=self.handle_client, args=(client_socket, client_address))
-                client_thread.daemon = True
-                client_thread.start()
+            self.core.serve_forever()
         except Exception as e:
             self.log_message(f"Server error: {str(e)}")
-        finally:
-            if self.server_socket:
-                self.server_socket.close()
-    
-    def handle_client(self, client_socket, client_address):
-        username = None
-        try:
-            # Receive username
-            username = client_socket.recv(1024).decode('utf-8')
-            if username in self.clients:
-                client_socket.send("USERNAME_TAKEN".encode('utf-8'))
-                client_socket.close()
-                return
-            else:
-                client_socket.send("USERNAME_OK".encode('utf-8'))
-                
-            # Add client to the list
-            self.clients[username] = (client_socket, client_address)
-            self.log_message(f"New connection from {client_address} - Username: {username}")
-            self.update_clients_list()
-            
-            # Broadcast new user joined
-            self.broadcast_message(f"SERVER: {username} has joined the chat!", exclude_username=username)
-            
-            # Handle client messages
-            while True:
-                message = client_socket.recv(1024).decode('utf-8')
-                if not message:
-                    break
-                
-                # Broadcast the message to all clients except the sender
-                self.broadcast_message(f"{username}: {message}", exclude_username=username)
-                
-        except Exception as e:
-            self.log_message(f"Error handling client {client_address}: {str(e)}")
-        finally:
-            if username in self.clients:
-                client_socket.close()
-                del self.clients[username]
-                self.broadcast_message(f"SERVER: {username} has left the chat!", exclude_username=username)
-                self.log_message(f"Connection closed: {client_address} - Username: {username}")
-                self.update_clients_list()
     
-    def broadcast_message(self, message, exclude_username=None):
-        self.log_message(f"Broadcasting: {message}")
-        for username, (client_socket, _) in list(self.clients.items()):
-            if username == exclude_username:
-                continue
-            try:
-                client_socket.send(message.encode('utf-8'))
-            except:
-                # Client connection may be broken
-                pass
+    @property
+    def clients(self):
+        return self.core.clients if self.core else {}
     
     def stop_server(self):
-        if self.server_socket:
-            # Notify clients that server is shutting down
-            self.broadcast_message("SERVER: Server is shutting down!")
-            
-            # Close all client connections
-            for username, (client_socket, _) in list(self.clients.items()):
-                try:
-                    client_socket.close()
-                except:
-                    pass
-            
-            # Close server socket
-            try:
-                self.server_socket.close()
-            except:
-                pass
-            
-            self.server_socket = None
-            self.clients = {}
+        if self.core:
+            # Notify clients; the loop then closes every connection and exits
+            self.core.stop(notice="SERVER: Server is shutting down!")
+            self.core = None
             self.status_label.config(text="Offline", fg="red")
             self.start_button.config(state="normal")
             self.stop_button.config(state="disabled")
             self.log_message("Server stopped")
-            self.update_clients_list()
+            self.events.put(('reset',))
     
     def log_message(self, message):
-        self.log_area.config(state="normal")
-        self.log_area.insert(tk.END, message + "\n")
-        self.log_area.see(tk.END)
-        self.log_area.config(state="disabled")
+        # Safe from any thread; shown on the next process_events() pass.
+        self.events.put(('log', message))
     
-    def update_clients_list(self):
-        self.clients_area.config(state="normal")
-        self.clients_area.delete(1.0, tk.END)
-        
-        for i, username in enumerate(self.clients.keys()):
-            self.clients_area.insert(tk.END, f"{i+1}. {username} - {self.clients[username][1]}\n")
-            
-        self.clients_area.config(state="disabled")
-    
-    def on_closing(self):
-        if messagebox.askokcancel("Quit", "Do you want to close the server?"):
-            self.stop_server()
-            self.root.destroy()
+    def process_events(self):
+        """Apply everything queued since the last pass in one batch (Tk thread)."""
+        log_lines = deque(maxlen=self.max_log_lines)
+        changes = []
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == 'log':
+                log_lines.append(event[1])
+            else:
+                changes.append(event)
+        if log_lines:
+            self.append_log(log_lines)
+        if changes:
+            self.update_clients_list(changes)
+        self.root.after(self.UI_INTERVAL_MS, self.process_events)
     
-    def run(self):
-        self.root.mainloop()
-
-if __name__ == "__main__":
-    server = ChatServer()
-    server.run()
-    self.start_button.config(state="normal")
-    self.stop_button.config(state="disabled")
-    self.log_message("Server stopped")
-    self.update_clients_list()
-
-    def log_message(self, message):
+    def append_log(self, lines):
         self.log_area.config(state="normal")
-        self.log_area.insert(tk.END, message + "\n")
+        self.log_area.insert(tk.END, "\n".join(lines) + "\n")
+        # Keep only the newest max_log_lines lines (the widget ends with an empty line).
+        excess = int(self.log_area.index("end-1c").split(".")[0]) - 1 - self.max_log_lines
+        if excess > 0:
+            self.log_area.delete("1.0", f"{excess + 1}.0")
         self.log_area.see(tk.END)
         self.log_area.config(state="disabled")
     
-    def update_clients_list(self):
+    def update_clients_list(self, changes):
+        # Patch only the affected lines instead of redrawing the whole list.
         self.clients_area.config(state="normal")
-        self.clients_area.delete(1.0, tk.END)
-        
-        for i, username in enumerate(self.clients.keys()):
-            self.clients_area.insert(tk.END, f"{i+1}. {username} - {self.clients[username][1]}\n")
-            
+        for change in changes:
+            if change[0] == 'join':
+                _, username, addr = change
+                self.client_rows.append(username)
+                self.clients_area.insert(tk.END, f"{username} - {addr}\n")
+            elif change[0] == 'leave':
+                try:
+                    row = self.client_rows.index(change[1]) + 1
+                except ValueError:
+                    continue
+                del self.client_rows[row - 1]
+                self.clients_area.delete(f"{row}.0", f"{row + 1}.0")
+            else:  # reset
+                self.client_rows = []
+                self.clients_area.delete("1.0", tk.END)
         self.clients_area.config(state="disabled")
     
     def on_closing(self):
@@ -1,4 +1,10 @@
+import argparse
 import copy
+from collections import deque
+
+from dvr_tables import save_tables
+
+OUTPUT_MODES = ('full', 'diff', 'quiet')
 
 class DistanceVectorRouting:
     def __init__(self, graph):
@@ -9,6 +15,8 @@ class DistanceVectorRouting:
         self.nodes = list(graph.keys())
         self.dist_vectors = {node: {n: float('inf') for n in self.nodes} for node in self.nodes}
         self.next_hops = {node: {n: None for n in self.nodes} for node in self.nodes}
+        # Incremented whenever the tables change, so compiled views can refresh.
+        self.version = 0
         # Distance to self is 0
         for node in self.nodes:
             self.dist_vectors[node][node] = 0
@@ -17,17 +25,26 @@ class DistanceVectorRouting:
                     self.dist_vectors[node][neighbor] = self.graph[node][neighbor]
                     self.next_hops[node][neighbor] = neighbor
 
-    def run(self, max_iterations=100):
+    def run(self, max_iterations=100, output='full'):
         """
         Run the Distance Vector Routing algorithm until convergence or max_iterations.
-        Print each step of the algorithm.
+        output: 'full' prints every routing table after each step, 'diff' prints
+        only the entries that changed in each iteration, 'quiet' prints nothing.
+        Returns the number of iterations that were executed.
         """
-        print("\nInitial State:")
-        self.print_dist_vectors()
+        check_output_mode(output)
+        if output == 'full':
+            print("\nInitial State:")
+            self.print_dist_vectors()
+        position = {node: i for i, node in enumerate(self.nodes)}
 
+        iterations = 0
         for iteration in range(max_iterations):
-            print(f"\nIteration {iteration + 1}:")
+            iterations = iteration + 1
+            if output != 'quiet':
+                print(f"\nIteration {iteration + 1}:")
             updated = False
+            changed = set()
             old_dist_vectors = copy.deepcopy(self.dist_vectors)
 
             for node in self.nodes:
@@ -42,12 +59,127 @@ class DistanceVectorRouting:
                             self.dist_vectors[node][dest] = new_cost
                             self.next_hops[node][dest] = neighbor
                             updated = True
+                            if output == 'diff':
+                                changed.add((node, dest))
 
-            self.print_dist_vectors()
+            if output == 'full':
+                self.print_dist_vectors()
+            elif output == 'diff':
+                changed = sorted(changed, key=lambda entry: (position[entry[0]], position[entry[1]]))
+                print_changed_entries((node, dest, self.dist_vectors[node][dest], self.next_hops[node][dest])
+                                      for node, dest in changed)
 
             if not updated:
-                print("Converged!")
+                if output != 'quiet':
+                    print("Converged!")
                 break
+            self.version += 1
+
+        return iterations
+
+    def export_tables(self, path):
+        """Write the current tables in the binary format of dvr_tables.py."""
+        index = {node: i for i, node in enumerate(self.nodes)}
+        dist = ([self.dist_vectors[node][dest] for dest in self.nodes] for node in self.nodes)
+        next_hop = ([index.get(self.next_hops[node][dest], -1) for dest in self.nodes] for node in self.nodes)
+        save_tables(path, self.nodes, dist, next_hop)
+
+    def update_link(self, u, v, cost):
+        """
+        Change the cost of the undirected link u-v (float('inf') removes it) on a
+        converged instance and repair only the routes that are affected, instead
+        of re-running from scratch.
+
+        - Cost increase / failure: every route that reaches a destination through
+          the link (the subtree of next hops below it) is poisoned to inf, then
+          recomputed from neighbors whose own route does not point back at the
+          node (poison reverse). Poisoning the whole subtree first prevents
+          count-to-infinity between routers that still point at each other.
+        - Cost decrease / new link: the link endpoints re-evaluate routes via
+          each other (split horizon: a neighbor's route that uses us is ignored).
+        - Every entry that improves triggers an update to its neighbors, which is
+          processed until no entry changes.
+
+        Costs after the update equal those of a full re-run; among equal-cost
+        alternatives a different next hop may be chosen.
+        Returns the number of distance vector entries that were touched.
+        """
+        inf = float('inf')
+        old_cost = self.graph[u].get(v, inf)
+        self.graph[u][v] = cost
+        self.graph[v][u] = cost
+        if cost == old_cost:
+            return 0
+
+        touched = 0
+        triggered = deque()
+
+        if cost > old_cost:
+            for a, b in ((u, v), (v, u)):
+                for dest in self.nodes:
+                    if dest == a or self.next_hops[a][dest] != b:
+                        continue
+                    poisoned = []
+                    stack = [a]
+                    while stack:
+                        node = stack.pop()
+                        self.dist_vectors[node][dest] = inf
+                        self.next_hops[node][dest] = None
+                        poisoned.append(node)
+                        for neighbor, _ in self._links(node):
+                            if self.next_hops[neighbor][dest] == node:
+                                stack.append(neighbor)
+                    touched += len(poisoned)
+
+                    for node in poisoned:
+                        best, hop = inf, None
+                        for neighbor, link_cost in self._links(node):
+                            if self.next_hops[neighbor][dest] == node:
+                                continue
+                            new_cost = link_cost + self.dist_vectors[neighbor][dest]
+                            if new_cost < best:
+                                best, hop = new_cost, neighbor
+                        if hop is not None:
+                            self.dist_vectors[node][dest] = best
+                            self.next_hops[node][dest] = hop
+                            triggered.append((node, dest))
+        else:
+            for a, b in ((u, v), (v, u)):
+                for dest in self.nodes:
+                    if self.next_hops[b][dest] == a:
+                        continue
+                    new_cost = cost + self.dist_vectors[b][dest]
+                    if new_cost < self.dist_vectors[a][dest]:
+                        self.dist_vectors[a][dest] = new_cost
+                        self.next_hops[a][dest] = b
+                        triggered.append((a, dest))
+                        touched += 1
+
+        # Triggered updates: a changed entry is advertised to the neighbors only.
+        while triggered:
+            node, dest = triggered.popleft()
+            for neighbor, link_cost in self._links(node):
+                if self.next_hops[node][dest] == neighbor:
+                    continue
+                new_cost = link_cost + self.dist_vectors[node][dest]
+                if new_cost < self.dist_vectors[neighbor][dest]:
+                    self.dist_vectors[neighbor][dest] = new_cost
+                    self.next_hops[neighbor][dest] = node
+                    triggered.append((neighbor, dest))
+                    touched += 1
+
+        if touched:
+            self.version += 1
+        return touched
+
+    def fail_link(self, u, v):
+        """Remove the link u-v. Returns the number of entries touched."""
+        return self.update_link(u, v, float('inf'))
+
+    def _links(self, node):
+        for neighbor, cost in self.graph[node].items():
+            if neighbor != node and cost != float('inf'):
+                yield neighbor, cost
 
     def print_dist_vectors(self):
         print("\nRouting Tables:")
@@ -61,6 +193,32 @@ class DistanceVectorRouting:
                 next_hop = self.next_hops[node][dest] or "-"
                 print(f"{dest:<11} | {cost_str:<4} | {next_hop}")
 
+def check_output_mode(output):
+    if output not in OUTPUT_MODES:
+        raise ValueError(f"output must be one of {OUTPUT_MODES}, got {output!r}")
+
+
+def print_changed_entries(entries):
+    """Print (node, dest, cost, next hop) tuples for 'diff' output."""
+    count = 0
+    for node, dest, cost, next_hop in entries:
+        if count == 0:
+            print("Node        | Destination | Cost | Next Hop")
+            print("--------------------------------------------")
+        cost_str = "inf" if cost == float('inf') else str(cost)
+        print(f"{node:<11} | {dest:<11} | {cost_str:<4} | {next_hop if next_hop is not None else '-'}")
+        count += 1
+    print(f"{count} entries changed")
+
+
+def parse_args(description="Distance Vector Routing simulation"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--output", choices=OUTPUT_MODES, default="full",
+                        help="print full tables every iteration, only changed entries, or nothing")
+    parser.add_argument("--export", metavar="PATH", help="write the final tables in binary DVRT format")
+    return parser.parse_args()
+
+
 def get_user_input_graph():
     num_nodes = int(input("Enter the number of nodes: "))
     node_names = input(f"Enter the names of the {num_nodes} nodes (space-separated): ").split()
@@ -86,6 +244,9 @@ def get_user_input_graph():
     return graph
 
 if __name__ == "__main__":
+    args = parse_args()
     user_graph = get_user_input_graph()
     dvr = DistanceVectorRouting(user_graph)
-    dvr.run()
+    dvr.run(output=args.output)
+    if args.export:
+        dvr.export_tables(args.export)
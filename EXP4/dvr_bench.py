@@ -0,0 +1,112 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from dvr import DistanceVectorRouting
+from dvr_topologies import TOPOLOGIES, count_links
+
+
+def _numpy_engine():
+    from dvr_numpy import NumpyDistanceVectorRouting
+    return NumpyDistanceVectorRouting
+
+
+def _sparse_engine():
+    from dvr_numpy import NumpyDistanceVectorRouting
+    from dvr_sparse import CSRGraph
+    return lambda graph: NumpyDistanceVectorRouting(CSRGraph.from_dict(graph))
+
+
+def _parallel_engine():
+    from dvr_parallel import ParallelDistanceVectorRouting
+    return ParallelDistanceVectorRouting
+
+
+# Engines are imported lazily so the baseline runs without NumPy installed.
+ENGINES = {
+    'dict': lambda: DistanceVectorRouting,
+    'numpy': _numpy_engine,
+    'sparse': _sparse_engine,
+    'parallel': _parallel_engine,
+}
+
+
+def bench_once(make_router, graph):
+    """Build and converge one router; returns (rounds, seconds)."""
+    start = time.perf_counter()
+    router = make_router(graph)
+    rounds = router.run(max_iterations=len(graph) + 1, output='quiet')
+    return rounds, time.perf_counter() - start
+
+
+def peak_memory(make_router, graph):
+    """Peak bytes allocated while building and converging (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        router = make_router(graph)
+        router.run(max_iterations=len(graph) + 1, output='quiet')
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(topology, num_nodes, engine='dict', seed=0, repeat=1, memory=True):
+    """
+    Benchmark one engine on one seeded topology and return a result record.
+
+    A relaxation is one candidate evaluation cost(u, v) + dist_v[d], so a
+    round performs (directed links x nodes) of them. Time is the best of
+    `repeat` runs; memory is measured in a separate run because tracemalloc
+    slows allocation-heavy code down.
+    """
+    make_router = ENGINES[engine]()
+    graph = TOPOLOGIES[topology](num_nodes, seed=seed)
+    links = count_links(graph)
+    runs = [bench_once(make_router, graph) for _ in range(repeat)]
+    rounds = runs[0][0]
+    seconds = min(elapsed for _, elapsed in runs)
+    relaxations = rounds * links * num_nodes
+    return {
+        'topology': topology,
+        'nodes': num_nodes,
+        'links': links // 2,
+        'engine': engine,
+        'seed': seed,
+        'rounds': rounds,
+        'seconds': seconds,
+        'peak_bytes': peak_memory(make_router, graph) if memory else None,
+        'relaxations': relaxations,
+        'relaxations_per_sec': relaxations / seconds if seconds else None,
+        'python': platform.python_version(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DVR engines on synthetic topologies")
+    parser.add_argument("--topology", nargs="+", choices=sorted(TOPOLOGIES), default=sorted(TOPOLOGIES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50, 100, 200])
+    parser.add_argument("--engine", nargs="+", choices=sorted(ENGINES), default=["dict"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="report the best of N timed runs")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--out", metavar="PATH", help="append JSON lines to PATH instead of stdout")
+    args = parser.parse_args()
+
+    out = open(args.out, "a") if args.out else sys.stdout
+    try:
+        for topology in args.topology:
+            for num_nodes in args.sizes:
+                for engine in args.engine:
+                    record = bench(topology, num_nodes, engine, args.seed, args.repeat, not args.no_memory)
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from array import array
+from collections import OrderedDict
+
+
+class ForwardingTable:
+    """
+    Compiled forwarding structure built from converged DVR state.
+
+    Next hops are flattened into one row-major array('i') of node indices
+    (-1 = no route), so next_hop_index(src, dst) is a single array index.
+    Full paths are reconstructed by following next hops and kept in an LRU
+    cache. The table remembers the router's `version` and recompiles (which
+    also drops every cached path) as soon as the router's tables change.
+
+    router: any engine from this directory (DistanceVectorRouting,
+    NumpyDistanceVectorRouting, ...) or a dvr_tables.RoutingTables file view.
+    """
+
+    def __init__(self, router, cache_size=65536):
+        self.router = router
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.compile()
+
+    def compile(self):
+        """(Re)build the flat next-hop array and clear the path cache."""
+        router = self.router
+        self.nodes = list(router.nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.n = len(self.nodes)
+        self.version = router.version
+
+        self._next = array('i')
+        table = getattr(router, 'next_hop', None)
+        if table is not None:
+            # NumPy engines and RoutingTables already hold index tables.
+            if hasattr(table, 'astype'):
+                table = table.astype('i4', copy=False)
+            self._next.frombytes(table.tobytes())
+        else:
+            index = self.index
+            for node in self.nodes:
+                row = router.next_hops[node]
+                self._next.extend(index.get(row[dest], -1) for dest in self.nodes)
+        self._cache = OrderedDict()
+
+    def _refresh(self):
+        if self.router.version != self.version:
+            self.compile()
+
+    def next_hop_index(self, src, dst):
+        """Next hop index from node index src to node index dst (-1 = none)."""
+        # _refresh() inlined: this is the per-packet hot path.
+        if self.router.version != self.version:
+            self.compile()
+        return self._next[src * self.n + dst]
+
+    def next_hop(self, src, dst):
+        """Next hop name from node src to node dst, or None."""
+        hop = self.next_hop_index(self.index[src], self.index[dst])
+        return self.nodes[hop] if hop >= 0 else None
+
+    def path_indices(self, src, dst):
+        """
+        Tuple of node indices from src to dst (inclusive), or None when dst is
+        unreachable or the next hops loop. Results are LRU-cached.
+        """
+        self._refresh()
+        key = src * self.n + dst
+        cache = self._cache
+        path = cache.get(key, False)
+        if path is not False:
+            cache.move_to_end(key)
+            self.hits += 1
+            return path
+
+        self.misses += 1
+        path = [src]
+        node = src
+        next_hops = self._next
+        n = self.n
+        while node != dst:
+            node = next_hops[node * n + dst]
+            if node < 0 or len(path) > n:
+                path = None
+                break
+            path.append(node)
+        if path is not None:
+            path = tuple(path)
+
+        cache[key] = path
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return path
+
+    def path(self, src, dst):
+        """List of node names from src to dst, or None if unreachable."""
+        path = self.path_indices(self.index[src], self.index[dst])
+        return None if path is None else [self.nodes[i] for i in path]
+
+    def next_hops_batch(self, srcs, dsts):
+        """
+        Next hop indices for many (src, dst) index pairs. NumPy integer arrays
+        are answered with one vectorized gather; other sequences return a list.
+        """
+        self._refresh()
+        if hasattr(srcs, 'dtype'):
+            import numpy as np
+            flat = np.frombuffer(self._next, dtype=np.int32)
+            return flat[np.asarray(srcs) * self.n + np.asarray(dsts)]
+        next_hops = self._next
+        n = self.n
+        return [next_hops[s * n + d] for s, d in zip(srcs, dsts)]
+
+    def paths_batch(self, pairs):
+        """Index paths for an iterable of (src, dst) index pairs."""
+        self._refresh()
+        return [self.path_indices(src, dst) for src, dst in pairs]
+
+    def invalidate(self):
+        """Force a recompile, e.g. after editing the router's tables by hand."""
+        self.compile()
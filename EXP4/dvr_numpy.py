@@ -0,0 +1,213 @@
+import numpy as np
+
+from dvr import check_output_mode, get_user_input_graph, parse_args, print_changed_entries
+from dvr_sparse import CSRGraph
+from dvr_tables import save_tables
+
+
+def build_slots(csr, dtype, lo=0, hi=None):
+    """
+    Group the links of csr into relaxation slots, optionally only for the
+    rows in [lo, hi).
+
+    Slot k holds the k-th neighbor of every node (in graph iteration order),
+    so relaxing slots in order reproduces the tie-breaking of the pure Python
+    loop. Rows are sorted by degree so that slot k only touches the nodes that
+    actually have a k-th neighbor, which keeps the work per round proportional
+    to the number of links.
+    """
+    degrees = csr.degrees()
+    n = len(degrees)
+    hi = n if hi is None else hi
+    order = np.argsort(-degrees, kind='stable')
+    at_most = np.cumsum(np.bincount(degrees, minlength=1))
+    slots = []
+    for k in range(int(degrees.max()) if n else 0):
+        rows = order[:n - int(at_most[k])]
+        if lo != 0 or hi != n:
+            rows = rows[(rows >= lo) & (rows < hi)]
+            if not len(rows):
+                continue
+        pos = csr.indptr[rows] + k
+        slots.append((rows, csr.indices[pos].astype(np.int64), csr.costs[pos].astype(dtype)))
+    return slots
+
+
+def relax_slots(slots, old_dist, new_dist, next_hop, block_elements=1 << 22):
+    """
+    Relax the rows covered by slots against old_dist, writing improvements into
+    new_dist/next_hop (which must already hold the previous values for those
+    rows). Returns True if any entry improved.
+    """
+    step = max(1, block_elements // max(old_dist.shape[1], 1))
+    updated = False
+    for slot_rows, slot_cols, slot_costs in slots:
+        for start in range(0, len(slot_rows), step):
+            rows = slot_rows[start:start + step]
+            cols = slot_cols[start:start + step]
+            candidate = slot_costs[start:start + step, None] + old_dist[cols]
+            better = candidate < new_dist[rows]
+            if not better.any():
+                continue
+            updated = True
+            hit_rows, hit_dests = np.nonzero(better)
+            new_dist[rows[hit_rows], hit_dests] = candidate[hit_rows, hit_dests]
+            next_hop[rows[hit_rows], hit_dests] = cols[hit_rows]
+    return updated
+
+
+class NumpyDistanceVectorRouting:
+    """
+    Array-backed drop-in replacement for DistanceVectorRouting.
+
+    The cost graph, distance vectors and next hops are kept in dense NumPy
+    arrays (next hops as node indices, -1 for "no route") and every round is
+    a batched min-plus relaxation over neighbor slots instead of a Python
+    loop over node x neighbor x destination. A CSRGraph can be passed instead
+    of a dict, in which case links are only ever stored sparsely.
+    """
+
+    def __init__(self, graph, dtype=np.float64, block_elements=1 << 22):
+        """
+        graph: dict of dict where graph[u][v] = cost from u to v (inf if no direct link),
+               or a CSRGraph for large sparse topologies (no dense cost matrix is built).
+        dtype: element type of the distance table (float32 halves memory on huge graphs).
+        block_elements: upper bound on the size of temporary arrays per relaxation step.
+        """
+        self.graph = graph
+        self.csr = graph if isinstance(graph, CSRGraph) else CSRGraph.from_dict(graph)
+        self.nodes = self.csr.nodes
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.block_elements = block_elements
+        n = len(self.nodes)
+
+        rows = np.repeat(np.arange(n), self.csr.degrees())
+        links = self.csr.indices
+        self.dist = np.full((n, n), np.inf, dtype=dtype)
+        self.next_hop = np.full((n, n), -1, dtype=np.int32)
+        np.fill_diagonal(self.dist, 0)
+        np.minimum.at(self.dist, (rows, links), self.csr.costs.astype(dtype))
+        self.next_hop[rows, links] = links
+        self._spare = np.empty_like(self.dist)
+        # Incremented whenever the tables change, so compiled views can refresh.
+        self.version = 0
+
+        self._diag_values = [0] * n
+        self._int_costs = False
+        self.cost = None
+        if not isinstance(graph, CSRGraph):
+            # Dense link costs; the diagonal stays inf because a self link
+            # (cost >= 0) can never strictly improve a route.
+            self.cost = np.full((n, n), np.inf)
+            self.cost[rows, links] = self.csr.costs
+            self._int_costs = all(isinstance(cost, int)
+                                  for node in self.nodes for neighbor, cost in graph[node].items()
+                                  if neighbor != node and cost != float('inf'))
+            # Same initial state as DistanceVectorRouting, including the self
+            # entry when the graph lists graph[u][u].
+            for u, node in enumerate(self.nodes):
+                cost = graph[node].get(node)
+                if cost is not None and cost != float('inf'):
+                    self.dist[u, u] = cost
+                    self.next_hop[u, u] = u
+                    self._diag_values[u] = cost
+
+        self._slots = build_slots(self.csr, self.dist.dtype)
+
+    def relax(self):
+        """
+        Perform one synchronous round against a snapshot of the previous
+        distance vectors. Returns True if any entry improved.
+        """
+        old_dist = self.dist
+        new_dist = self._spare
+        np.copyto(new_dist, old_dist)
+        updated = relax_slots(self._slots, old_dist, new_dist, self.next_hop, self.block_elements)
+        self.dist, self._spare = new_dist, old_dist
+        if updated:
+            self.version += 1
+        return updated
+
+    def run(self, max_iterations=100, output='full'):
+        """
+        Run the Distance Vector Routing algorithm until convergence or max_iterations.
+        output: 'full' prints every routing table after each step, 'diff' prints
+        only the entries that changed in each iteration, 'quiet' prints nothing.
+        Returns the number of iterations that were executed.
+        """
+        check_output_mode(output)
+        if output == 'full':
+            print("\nInitial State:")
+            self.print_dist_vectors()
+
+        iterations = 0
+        for iteration in range(max_iterations):
+            iterations = iteration + 1
+            if output != 'quiet':
+                print(f"\nIteration {iteration + 1}:")
+            updated = self.relax()
+
+            if output == 'full':
+                self.print_dist_vectors()
+            elif output == 'diff':
+                self.print_changes()
+
+            if not updated:
+                if output != 'quiet':
+                    print("Converged!")
+                break
+
+        return iterations
+
+    def print_changes(self):
+        """Print the entries changed by the last relax() call."""
+        rows, dests = np.nonzero(self.dist != self._spare)
+        print_changed_entries((self.nodes[u], self.nodes[d], self._value(u, d), self.nodes[self.next_hop[u, d]])
+                              for u, d in zip(rows.tolist(), dests.tolist()))
+
+    def export_tables(self, path):
+        """Write the current tables in the binary format of dvr_tables.py."""
+        save_tables(path, self.nodes, self.dist.astype('<f8', copy=False), self.next_hop.astype('<i4', copy=False))
+
+    def _value(self, u, d):
+        cost = self.dist[u, d]
+        if cost == np.inf:
+            return float('inf')
+        if u == d and cost == self._diag_values[u]:
+            return self._diag_values[u]
+        return int(cost) if self._int_costs else float(cost)
+
+    @property
+    def dist_vectors(self):
+        """dist_vectors[u][d] as nested dicts, matching DistanceVectorRouting."""
+        return {node: {dest: self._value(u, d) for d, dest in enumerate(self.nodes)}
+                for u, node in enumerate(self.nodes)}
+
+    @property
+    def next_hops(self):
+        """next_hops[u][d] as nested dicts, matching DistanceVectorRouting."""
+        return {node: {dest: (self.nodes[hop] if hop >= 0 else None)
+                       for dest, hop in zip(self.nodes, self.next_hop[u].tolist())}
+                for u, node in enumerate(self.nodes)}
+
+    def print_dist_vectors(self):
+        print("\nRouting Tables:")
+        for u, node in enumerate(self.nodes):
+            print(f"\nNode {node}:")
+            print("Destination | Cost | Next Hop")
+            print("-----------------------------")
+            hops = self.next_hop[u].tolist()
+            for d, dest in enumerate(self.nodes):
+                cost = self._value(u, d)
+                cost_str = "inf" if cost == float('inf') else str(cost)
+                next_hop = (self.nodes[hops[d]] if hops[d] >= 0 else None) or "-"
+                print(f"{dest:<11} | {cost_str:<4} | {next_hop}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    user_graph = get_user_input_graph()
+    dvr = NumpyDistanceVectorRouting(user_graph)
+    dvr.run(output=args.output)
+    if args.export:
+        dvr.export_tables(args.export)
@@ -0,0 +1,169 @@
+import multiprocessing as mp
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from dvr import get_user_input_graph
+from dvr_numpy import NumpyDistanceVectorRouting, build_slots, relax_slots
+from dvr_sparse import CSRGraph
+from dvr_topologies import erdos_renyi
+
+# Per-process state of a pool worker, set up once by _init_worker.
+_worker = {}
+
+
+def _init_worker(shm_names, shape, dtype, csr_arrays, block_elements):
+    segments = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    dist_dtype = np.dtype(dtype)
+    _worker['segments'] = segments
+    _worker['dist'] = [np.ndarray(shape, dtype=dist_dtype, buffer=seg.buf) for seg in segments[:2]]
+    _worker['next_hop'] = np.ndarray(shape, dtype=np.int32, buffer=segments[2].buf)
+    _worker['csr'] = CSRGraph(range(shape[0]), *csr_arrays)
+    _worker['dtype'] = dist_dtype
+    _worker['block_elements'] = block_elements
+    _worker['slots'] = {}
+
+
+def _relax_block(task):
+    lo, hi, current = task
+    slots = _worker['slots'].get((lo, hi))
+    if slots is None:
+        slots = build_slots(_worker['csr'], _worker['dtype'], lo, hi)
+        _worker['slots'][(lo, hi)] = slots
+    old_dist = _worker['dist'][current]
+    new_dist = _worker['dist'][1 - current]
+    new_dist[lo:hi] = old_dist[lo:hi]
+    return relax_slots(slots, old_dist, new_dist, _worker['next_hop'], _worker['block_elements'])
+
+
+class ParallelDistanceVectorRouting(NumpyDistanceVectorRouting):
+    """
+    NumpyDistanceVectorRouting whose rounds are split across a process pool.
+
+    The two distance buffers (previous / next round) and the next-hop table
+    live in shared memory. Each worker owns a contiguous block of rows
+    (balanced by link count) and relaxes it against the previous round's
+    buffer, so only (lo, hi, buffer index) tuples and a bool per block cross
+    process boundaries each round. Rows are independent within a round, which
+    makes the result identical to the serial engine.
+    """
+
+    def __init__(self, graph, workers=None, **kwargs):
+        super().__init__(graph, **kwargs)
+        self.workers = workers or mp.cpu_count()
+        self._pool = None
+        self._segments = []
+
+    def _row_blocks(self):
+        # Split rows so every block carries about the same number of links.
+        n = len(self.nodes)
+        parts = min(self.workers, max(n, 1))
+        work = self.csr.indptr + np.arange(n + 1)  # links + one per row
+        bounds = np.searchsorted(work, np.linspace(0, work[-1], parts + 1)[1:-1])
+        edges = [0] + sorted(set(int(b) for b in bounds)) + [n]
+        return [(lo, hi) for lo, hi in zip(edges, edges[1:]) if hi > lo]
+
+    def start(self):
+        """Move the tables into shared memory and start the worker pool."""
+        if self._pool is not None:
+            return
+        arrays = [self.dist, self._spare, self.next_hop]
+        self._segments = [shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1)) for a in arrays]
+        shared = []
+        for array, segment in zip(arrays, self._segments):
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+            view[...] = array
+            shared.append(view)
+        self.dist, self._spare, self.next_hop = shared
+        self._current = 0
+        self._blocks = self._row_blocks()
+
+        csr_arrays = (self.csr.indptr, self.csr.indices, self.csr.costs)
+        context = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+        self._pool = context.Pool(
+            len(self._blocks),
+            initializer=_init_worker,
+            initargs=([s.name for s in self._segments], self.dist.shape, self.dist.dtype.str,
+                      csr_arrays, self.block_elements),
+        )
+
+    def close(self):
+        """Stop the pool and copy the tables back out of shared memory."""
+        if self._pool is None:
+            return
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+        self.dist = self.dist.copy()
+        self._spare = np.empty_like(self.dist)
+        self.next_hop = self.next_hop.copy()
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def relax(self):
+        if self._pool is None:
+            return super().relax()
+        tasks = [(lo, hi, self._current) for lo, hi in self._blocks]
+        updated = any(self._pool.map(_relax_block, tasks))
+        self.dist, self._spare = self._spare, self.dist
+        self._current = 1 - self._current
+        if updated:
+            self.version += 1
+        return updated
+
+    def run(self, max_iterations=100, output='full'):
+        started = self._pool is None
+        self.start()
+        try:
+            return super().run(max_iterations, output)
+        finally:
+            if started:
+                self.close()
+
+
+def converge(router, max_iterations=10000):
+    """Relax without printing; returns the number of rounds executed."""
+    for iteration in range(max_iterations):
+        if not router.relax():
+            return iteration + 1
+    return max_iterations
+
+
+def benchmark(num_nodes=2000, degree=4, worker_counts=(1, 2, 4, 8), seed=0):
+    """Print serial vs parallel convergence time and speedup."""
+    graph = CSRGraph.from_dict(erdos_renyi(num_nodes, degree, seed))
+    serial = NumpyDistanceVectorRouting(graph)
+    start = time.perf_counter()
+    rounds = converge(serial)
+    baseline = time.perf_counter() - start
+    print(f"{num_nodes} nodes, {graph.num_edges} directed links, {rounds} rounds")
+    print("Workers | Time (s) | Speedup | Matches serial")
+    print("-------------------------------------------")
+    print(f"{'serial':<7} | {baseline:<8.3f} | {1.0:<7.2f} | -")
+    for workers in worker_counts:
+        with ParallelDistanceVectorRouting(graph, workers=workers) as router:
+            start = time.perf_counter()
+            converge(router)
+            elapsed = time.perf_counter() - start
+            same = np.array_equal(router.dist, serial.dist) and np.array_equal(router.next_hop, serial.next_hop)
+        print(f"{workers:<7} | {elapsed:<8.3f} | {baseline / elapsed:<7.2f} | {same}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        benchmark(*(int(arg) for arg in sys.argv[2:4]))
+    else:
+        user_graph = get_user_input_graph()
+        dvr = ParallelDistanceVectorRouting(user_graph)
+        dvr.run()
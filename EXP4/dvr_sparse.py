@@ -0,0 +1,179 @@
+import os
+from array import array
+
+import numpy as np
+
+# Binary edge-list record: little-endian uint32 src, uint32 dst, float64 cost.
+EDGE_DTYPE = np.dtype([('src', '<u4'), ('dst', '<u4'), ('cost', '<f8')])
+
+
+class CSRGraph:
+    """
+    Compressed sparse row adjacency for DVR topologies.
+
+    The links of node u are indices[indptr[u]:indptr[u + 1]] with matching
+    costs[indptr[u]:indptr[u + 1]]. Memory is O(nodes + links) instead of the
+    O(nodes^2) dict filled with float('inf') built by get_user_input_graph.
+    Missing links are simply absent; self links are not stored.
+    """
+
+    def __init__(self, nodes, indptr, indices, costs):
+        self.nodes = list(nodes)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.costs = np.asarray(costs, dtype=np.float64)
+        if len(self.indptr) != len(self.nodes) + 1:
+            raise ValueError("indptr must have len(nodes) + 1 entries")
+        if len(self.indices) != len(self.costs) or self.indptr[-1] != len(self.indices):
+            raise ValueError("indices/costs do not match indptr")
+
+    @property
+    def num_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def neighbors(self, u):
+        """Return (neighbor indices, costs) of node index u as array views."""
+        start, stop = self.indptr[u], self.indptr[u + 1]
+        return self.indices[start:stop], self.costs[start:stop]
+
+    @classmethod
+    def from_dict(cls, graph):
+        """
+        Build from the dict-of-dict format used by DistanceVectorRouting.
+        Neighbor order is preserved; inf costs and self links are dropped.
+        """
+        nodes = list(graph.keys())
+        index = {node: i for i, node in enumerate(nodes)}
+        indptr = array('q', [0])
+        indices = array('i')
+        costs = array('d')
+        for node in nodes:
+            for neighbor, cost in graph[node].items():
+                if cost == float('inf') or neighbor == node:
+                    continue
+                indices.append(index[neighbor])
+                costs.append(cost)
+            indptr.append(len(indices))
+        return cls(nodes, indptr, indices, costs)
+
+    @classmethod
+    def from_edges(cls, src, dst, cost, num_nodes, nodes=None, undirected=True):
+        """
+        Build from parallel arrays of node indices and costs.
+
+        Links are sorted by (src, dst); duplicate links keep the lowest cost and
+        self links and inf costs are dropped.
+        """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        cost = np.asarray(cost, dtype=np.float64)
+        if undirected:
+            src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+            cost = np.concatenate([cost, cost])
+
+        keep = (src != dst) & np.isfinite(cost)
+        src, dst, cost = src[keep], dst[keep], cost[keep]
+
+        order = np.lexsort((cost, dst, src))
+        src, dst, cost = src[order], dst[order], cost[order]
+        if len(src):
+            # After sorting, the first entry of each (src, dst) run is the cheapest.
+            first = np.ones(len(src), dtype=bool)
+            first[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+            src, dst, cost = src[first], dst[first], cost[first]
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=indptr[1:])
+        if nodes is None:
+            nodes = range(num_nodes)
+        return cls(nodes, indptr, dst, cost)
+
+    def to_dict(self):
+        """Sparse dict-of-dict (real links only) for the pure Python engine."""
+        graph = {}
+        for u, node in enumerate(self.nodes):
+            nbrs, costs = self.neighbors(u)
+            graph[node] = {self.nodes[v]: c for v, c in zip(nbrs.tolist(), costs.tolist())}
+        return graph
+
+
+def load_edge_list(path, binary=None, undirected=True, chunk_size=1 << 20):
+    """
+    Stream an edge list into a CSRGraph without building a dense matrix.
+
+    Text format: one "src dst cost" line per link (cost defaults to 1, 'inf'
+    means no link); blank lines and lines starting with '#' are ignored and
+    node names are arbitrary tokens, numbered in order of first appearance.
+
+    Binary format: packed EDGE_DTYPE records; node names are the integer ids.
+    binary=None picks the binary reader for files ending in '.bin'.
+    """
+    if binary is None:
+        binary = os.fspath(path).endswith('.bin')
+    if binary:
+        return _load_binary_edges(path, undirected, chunk_size)
+    return _load_text_edges(path, undirected)
+
+
+def _load_text_edges(path, undirected):
+    index = {}
+    src = array('q')
+    dst = array('q')
+    cost = array('d')
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if len(fields) not in (2, 3):
+                raise ValueError(f"{path}:{line_no}: expected 'src dst [cost]'")
+            u = index.setdefault(fields[0], len(index))
+            v = index.setdefault(fields[1], len(index))
+            src.append(u)
+            dst.append(v)
+            cost.append(float(fields[2]) if len(fields) == 3 else 1.0)
+    return CSRGraph.from_edges(src, dst, cost, len(index), nodes=index.keys(), undirected=undirected)
+
+
+def _load_binary_edges(path, undirected, chunk_size):
+    chunks = []
+    num_nodes = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = np.fromfile(f, dtype=EDGE_DTYPE, count=chunk_size)
+            if not len(chunk):
+                break
+            num_nodes = max(num_nodes, int(chunk['src'].max()) + 1, int(chunk['dst'].max()) + 1)
+            chunks.append(chunk)
+    edges = np.concatenate(chunks) if chunks else np.empty(0, dtype=EDGE_DTYPE)
+    return CSRGraph.from_edges(edges['src'], edges['dst'], edges['cost'], num_nodes, undirected=undirected)
+
+
+def write_edge_list(path, edges, binary=None):
+    """
+    Write an iterable of (src, dst, cost) links in the format read by
+    load_edge_list. Binary output requires integer node ids.
+    """
+    if binary is None:
+        binary = os.fspath(path).endswith('.bin')
+    if binary:
+        with open(path, 'wb') as f:
+            batch = []
+            for edge in edges:
+                batch.append(edge)
+                if len(batch) >= 1 << 16:
+                    np.array(batch, dtype=EDGE_DTYPE).tofile(f)
+                    batch = []
+            if batch:
+                np.array(batch, dtype=EDGE_DTYPE).tofile(f)
+    else:
+        with open(path, 'w') as f:
+            for u, v, c in edges:
+                f.write(f"{u} {v} {c}\n")
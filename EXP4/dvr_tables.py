@@ -0,0 +1,110 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+# File layout (all integers little-endian):
+#   header:   magic b'DVRT', uint16 version, uint16 reserved, uint64 node count,
+#             uint64 names length, uint64 dist offset, uint64 next-hop offset
+#   names:    UTF-8 JSON list of node names (ints stay ints)
+#   dist:     n*n float64, row-major, dist[u][d] (inf = no route)
+#   next hop: n*n int32, row-major, index of the next hop node (-1 = none)
+# Both tables start on an 8-byte boundary so they can be mapped directly,
+# e.g. numpy.memmap(path, dtype='<f8', offset=tables.dist_offset, shape=(n, n)).
+MAGIC = b'DVRT'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQQQ')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _write_table(f, table, typecode):
+    if hasattr(table, 'tobytes'):
+        # Already a contiguous little-endian array (e.g. from the NumPy engine).
+        f.write(table.tobytes())
+        return
+    for row in table:
+        values = array(typecode, row)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        values.tofile(f)
+
+
+def save_tables(path, nodes, dist, next_hop):
+    """
+    Write routing tables in the binary DVRT format.
+
+    dist / next_hop: either row iterables (one sequence per node, in node order;
+    next hops as node indices, -1 for none) or little-endian arrays with a
+    tobytes() method holding float64 / int32 values.
+    """
+    n = len(nodes)
+    names = json.dumps(list(nodes)).encode('utf-8')
+    dist_offset = _align(HEADER.size + len(names))
+    next_offset = dist_offset + 8 * n * n
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, n, len(names), dist_offset, next_offset))
+        f.write(names)
+        f.write(b'\0' * (dist_offset - HEADER.size - len(names)))
+        _write_table(f, dist, 'd')
+        _write_table(f, next_hop, 'i')
+
+
+class RoutingTables:
+    """
+    Read-only view of a DVRT file. The file is memory-mapped and dist /
+    next_hop are 2-D memoryviews into the mapping, so nothing is parsed or
+    copied up front: tables.dist[u, d] reads one value straight from the file.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n, names_len, dist_offset, next_offset = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path}: not a DVRT v{VERSION} routing table file")
+        self.nodes = json.loads(self._mmap[HEADER.size:HEADER.size + names_len].decode('utf-8'))
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        # The file never changes; present for ForwardingTable's change check.
+        self.version = 0
+        self.dist_offset = dist_offset
+        self.next_offset = next_offset
+        shape = (n, n)
+        buffer = memoryview(self._mmap)
+        if sys.byteorder == 'little':
+            self.dist = buffer[dist_offset:next_offset].cast('d', shape)
+            self.next_hop = buffer[next_offset:next_offset + 4 * n * n].cast('i', shape)
+        else:
+            dist = array('d', buffer[dist_offset:next_offset])
+            next_hop = array('i', buffer[next_offset:next_offset + 4 * n * n])
+            dist.byteswap()
+            next_hop.byteswap()
+            self.dist = memoryview(dist).cast('B').cast('d', shape)
+            self.next_hop = memoryview(next_hop).cast('B').cast('i', shape)
+        buffer.release()
+
+    def cost(self, node, dest):
+        return self.dist[self.index[node], self.index[dest]]
+
+    def next_hop_of(self, node, dest):
+        hop = self.next_hop[self.index[node], self.index[dest]]
+        return self.nodes[hop] if hop >= 0 else None
+
+    def close(self):
+        self.dist.release()
+        self.next_hop.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_tables(path):
+    return RoutingTables(path)
@@ -0,0 +1,84 @@
+import math
+import random
+
+
+def _add_link(graph, u, v, rng, max_cost):
+    if u != v and v not in graph[u]:
+        cost = rng.randint(1, max_cost)
+        graph[u][v] = cost
+        graph[v][u] = cost
+
+
+def ring(num_nodes, seed=0, max_cost=10):
+    """Cycle 0-1-...-(n-1)-0."""
+    rng = random.Random(seed)
+    graph = {u: {} for u in range(num_nodes)}
+    for u in range(num_nodes):
+        _add_link(graph, u, (u + 1) % num_nodes, rng, max_cost)
+    return graph
+
+
+def grid(num_nodes, seed=0, max_cost=10):
+    """Near-square 2-D mesh: node u links to its right and lower neighbors."""
+    rng = random.Random(seed)
+    width = max(1, int(math.sqrt(num_nodes)))
+    graph = {u: {} for u in range(num_nodes)}
+    for u in range(num_nodes):
+        if (u + 1) % width and u + 1 < num_nodes:
+            _add_link(graph, u, u + 1, rng, max_cost)
+        if u + width < num_nodes:
+            _add_link(graph, u, u + width, rng, max_cost)
+    return graph
+
+
+def erdos_renyi(num_nodes, avg_degree=4, seed=0, max_cost=10):
+    """
+    Random G(n, m) graph with m = n * avg_degree / 2 distinct links. It may be
+    disconnected; unreachable destinations simply stay at inf.
+    """
+    rng = random.Random(seed)
+    graph = {u: {} for u in range(num_nodes)}
+    max_links = num_nodes * (num_nodes - 1) // 2
+    target = min(int(num_nodes * avg_degree / 2), max_links)
+    links = 0
+    while links < target:
+        u, v = rng.randrange(num_nodes), rng.randrange(num_nodes)
+        if u != v and v not in graph[u]:
+            _add_link(graph, u, v, rng, max_cost)
+            links += 1
+    return graph
+
+
+def scale_free(num_nodes, links_per_node=2, seed=0, max_cost=10):
+    """Barabasi-Albert preferential attachment: each new node links to
+    links_per_node existing nodes chosen proportionally to their degree."""
+    rng = random.Random(seed)
+    graph = {u: {} for u in range(num_nodes)}
+    start = min(num_nodes, links_per_node + 1)
+    endpoints = []
+    for u in range(start):
+        for v in range(u + 1, start):
+            _add_link(graph, u, v, rng, max_cost)
+            endpoints += (u, v)
+    for u in range(start, num_nodes):
+        targets = set()
+        while len(targets) < links_per_node:
+            targets.add(rng.choice(endpoints))
+        for v in targets:
+            _add_link(graph, u, v, rng, max_cost)
+            endpoints += (u, v)
+    return graph
+
+
+TOPOLOGIES = {
+    'ring': ring,
+    'grid': grid,
+    'er': erdos_renyi,
+    'scale-free': scale_free,
+}
+
+
+def count_links(graph):
+    """Number of directed links (each undirected link counts twice)."""
+    return sum(1 for node in graph for neighbor, cost in graph[node].items()
+               if neighbor != node and cost != float('inf'))
@@ -0,0 +1,441 @@
+import argparse
+import cProfile
+import json
+import os
+import platform
+import pstats
+import selectors
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'EXP1'), os.path.join(ROOT, 'EXP2')]
+
+from tcp_framing import FrameDecoder, encode_frame  # noqa: E402
+from udp_reliable import MAX_PAYLOAD as RELIABLE_MAX_PAYLOAD, client_endpoint  # noqa: E402
+
+MAX_DATAGRAM = 65507
+UDP_SEQ = struct.Struct('!Q')
+RECV_SIZE = 256 * 1024
+
+# Each benchmark talks to the repo's own servers, started headlessly.
+SERVERS = {
+    'tcp-echo': ('EXP1/tcp_server.py', '--mode', 'loop', '--framed'),
+    'tcp-discard': ('EXP1/tcp_server.py', '--mode', 'loop', '--handler', 'discard'),
+    'udp-echo': ('EXP2/udp_server.py', '--batch', '--stats-interval', '0'),
+    'udp-discard': ('EXP2/udp_server.py', '--batch', '--reply', 'none', '--stats-interval', '0'),
+    'udp-reliable': ('EXP2/udp_server.py', '--reliable', '--reply', 'none', '--quiet'),
+}
+
+
+def free_port(kind, host='127.0.0.1'):
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def udp_socket_counters(port):
+    """(rx_queue bytes, drops) of the UDP socket bound to port, from /proc/net/udp; None elsewhere."""
+    try:
+        with open('/proc/net/udp') as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if int(fields[1].rsplit(':', 1)[1], 16) == port:
+                    return int(fields[4].split(':')[1], 16), int(fields[12])
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+class Server:
+    """One of SERVERS in a subprocess, optionally under cProfile; stop() sends SIGINT."""
+
+    def __init__(self, name, host, profile_path=None):
+        script, *args = SERVERS[name]
+        self.udp = name.startswith('udp')
+        self.host = host
+        self.port = free_port(socket.SOCK_DGRAM if self.udp else socket.SOCK_STREAM, host)
+        profiler = ['-m', 'cProfile', '-o', profile_path] if profile_path else []
+        command = [sys.executable, *profiler, os.path.join(ROOT, script), *args,
+                   '--host', host, '--port', str(self.port)]
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with status {self.process.returncode}")
+            if self.udp:
+                if udp_socket_counters(self.port) is not None:
+                    return
+                if not os.path.exists('/proc/net/udp'):
+                    time.sleep(0.5)
+                    return
+            else:
+                try:
+                    socket.create_connection((self.host, self.port), timeout=1).close()
+                    return
+                except OSError:
+                    pass
+            time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("server did not start")
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def latency_summary(latencies_ns):
+    latencies_ns.sort()
+    us = lambda ns: round(ns / 1e3, 1) if ns is not None else None
+    return {name: us(percentile(latencies_ns, fraction))
+            for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999))} | {
+        'max': us(latencies_ns[-1] if latencies_ns else None)}
+
+
+class TcpPingClient:
+    """One framed request in flight on one connection (tcp_server.py --framed)."""
+
+    def __init__(self, host, port, payload):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.payload = b'x' * payload
+        self.decoder = FrameDecoder()
+        self.request_id = 0
+        self.sent_at = 0
+
+    def send(self):
+        self.request_id += 1
+        self.sent_at = time.perf_counter_ns()
+        self.sock.sendall(encode_frame(self.request_id, self.payload))
+
+    def read(self):
+        """Consume what is readable; True once the reply to the last request is complete."""
+        data = self.sock.recv(RECV_SIZE)
+        if not data:
+            raise ConnectionError("server closed the connection")
+        return any(request_id == self.request_id for request_id, _ in self.decoder.feed(data))
+
+    def close(self):
+        self.sock.close()
+
+
+class UdpPingClient:
+    """One datagram in flight; the echo must carry the same sequence number."""
+
+    def __init__(self, host, port, payload):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+        self.padding = b'x' * max(0, min(payload, MAX_DATAGRAM) - UDP_SEQ.size)
+        self.seq = 0
+        self.sent_at = 0
+
+    def send(self):
+        self.seq += 1
+        self.sent_at = time.perf_counter_ns()
+        self.sock.send(UDP_SEQ.pack(self.seq) + self.padding)
+
+    def read(self):
+        try:
+            data = self.sock.recv(MAX_DATAGRAM)
+        except ConnectionRefusedError:
+            return False
+        return len(data) >= UDP_SEQ.size and UDP_SEQ.unpack_from(data)[0] == self.seq
+
+    def close(self):
+        self.sock.close()
+
+
+def closed_loop(clients, duration, warmup, lost_after=None):
+    """
+    Every client keeps one request outstanding and sends the next as soon as
+    the reply arrives. Replies completed during the `duration` seconds after
+    `warmup` are counted and their round trips recorded. A UDP request with
+    no reply after `lost_after` seconds counts as lost and is replaced.
+    """
+    selector = selectors.DefaultSelector()
+    for client in clients:
+        selector.register(client.sock, selectors.EVENT_READ, client)
+        client.send()
+    measure_from = time.perf_counter() + warmup
+    measure_from_ns = int(measure_from * 1e9)
+    end = measure_from + duration
+    latencies = []
+    lost = 0
+    next_check = time.perf_counter() + (lost_after or 0)
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            for key, _ in selector.select(min(end - now, 0.05)):
+                client = key.data
+                if client.read():
+                    done = time.perf_counter_ns()
+                    if done >= measure_from_ns:
+                        latencies.append(done - client.sent_at)
+                    client.send()
+            if lost_after and now >= next_check:
+                stale = time.perf_counter_ns() - int(lost_after * 1e9)
+                for client in clients:
+                    if client.sent_at < stale:
+                        lost += 1
+                        client.send()
+                next_check = now + lost_after
+    finally:
+        selector.close()
+    completed = len(latencies)
+    return {'requests': completed, 'requests_per_sec': completed / duration, 'lost': lost,
+            'rtt_us': latency_summary(latencies)}
+
+
+def pingpong(transport, host, port, payload, concurrency, duration, warmup, udp_timeout=0.2):
+    client_class = TcpPingClient if transport == 'tcp' else UdpPingClient
+    clients = [client_class(host, port, payload) for _ in range(concurrency)]
+    try:
+        return closed_loop(clients, duration, warmup, udp_timeout if transport == 'udp' else None)
+    finally:
+        for client in clients:
+            client.close()
+
+
+def tcp_bulk(host, port, chunk, concurrency, duration):
+    """Stream to the discard server on `concurrency` connections; timed until it has read everything."""
+    socks = [socket.create_connection((host, port)) for _ in range(concurrency)]
+    data = memoryview(b'x' * chunk)
+    selector = selectors.DefaultSelector()
+    for sock in socks:
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_WRITE)
+    sent = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        for key, _ in selector.select(0.05):
+            try:
+                sent += key.fileobj.send(data)
+            except BlockingIOError:
+                pass
+    selector.close()
+    for sock in socks:  # the loop-mode server closes once it reads EOF, i.e. after all the data
+        sock.setblocking(True)
+        sock.shutdown(socket.SHUT_WR)
+        while sock.recv(RECV_SIZE):
+            pass
+        sock.close()
+    elapsed = time.perf_counter() - start
+    return {'bytes': sent, 'seconds': elapsed, 'mbps': sent * 8 / elapsed / 1e6}
+
+
+def udp_bulk(host, port, payload, concurrency, duration):
+    """
+    Blast datagrams at the batch server (no replies) from `concurrency`
+    sockets. Delivery is read from the server socket's kernel counters: the
+    run ends when its receive queue is empty, and datagrams it dropped for
+    lack of buffer space are subtracted (loopback loses nothing else).
+    """
+    size = min(payload, MAX_DATAGRAM)
+    socks = []
+    for _ in range(concurrency):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.connect((host, port))
+        sock.setblocking(False)
+        socks.append(sock)
+    data = b'x' * size
+    before = udp_socket_counters(port)
+    sent = blocked = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        for sock in socks:
+            try:
+                sock.send(data)
+                sent += 1
+            except (BlockingIOError, ConnectionRefusedError):
+                blocked += 1
+    send_seconds = time.perf_counter() - start
+    for sock in socks:
+        sock.close()
+    record = {'datagrams': sent, 'send_blocked': blocked,
+              'sent_mbps': sent * size * 8 / send_seconds / 1e6}
+    if before is None:
+        return record
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline:
+        counters = udp_socket_counters(port)
+        if counters is None or counters[0] == 0:
+            break
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    dropped = udp_socket_counters(port)[1] - before[1]
+    delivered = sent - dropped
+    record.update(seconds=elapsed, dropped=dropped, loss=dropped / sent if sent else 0.0,
+                  mbps=delivered * size * 8 / elapsed / 1e6)
+    return record
+
+
+def reliable_bulk(host, port, payload, duration, window=64):
+    """Stream over the reliable UDP transport (udp_reliable.py); timed until everything is acknowledged."""
+    size = min(payload, RELIABLE_MAX_PAYLOAD)
+    endpoint = client_endpoint(window=window)
+    channel = endpoint.connect((host, port))
+    data = b'x' * size
+    sent = 0
+    try:
+        start = time.perf_counter()
+        end = start + duration
+        while time.perf_counter() < end:
+            while len(channel.backlog) < window:
+                channel.send(data)
+                sent += 1
+            endpoint.poll(0.01)
+        channel.flush(timeout=60)
+        elapsed = time.perf_counter() - start
+    finally:
+        endpoint.close()
+    stats = channel.stats()
+    return {'bytes': sent * size, 'seconds': elapsed, 'mbps': sent * size * 8 / elapsed / 1e6,
+            'retransmits': stats['retransmits'], 'timeouts': stats['timeouts']}
+
+
+# cProfile entries by where the time goes: waiting in the selector (idle,
+# or another process has the CPU), socket system calls, struct packing and
+# the frame codec (encode/decode), and everything else, i.e. interpreter work
+# (loops, handlers, bookkeeping). cProfile's clock is wall time, so shares
+# are of the busy time, without the wait.
+WAIT_MARKERS = ("'select.", "<built-in method select.")
+SYSCALL_MARKERS = ("'_socket.socket' objects", "<built-in method posix.")
+CODEC_MARKERS = ("'_struct.Struct' objects", "<built-in method _struct.", "'bytes' objects>", "'str' objects>")
+CODEC_FILES = ('tcp_framing.py',)
+
+
+def categorize(stats):
+    totals = {'wait': 0.0, 'syscalls': 0.0, 'encode_decode': 0.0, 'python': 0.0}
+    top = []
+    for (filename, _, name), (_, _, tottime, _, _) in stats.stats.items():
+        if any(marker in name for marker in WAIT_MARKERS):
+            category = 'wait'
+        elif any(marker in name for marker in SYSCALL_MARKERS):
+            category = 'syscalls'
+        elif any(marker in name for marker in CODEC_MARKERS) or os.path.basename(filename) in CODEC_FILES:
+            category = 'encode_decode'
+        else:
+            category = 'python'
+        totals[category] += tottime
+        if category != 'wait':
+            label = name if filename == '~' else f"{os.path.basename(filename)}:{name}"
+            top.append((tottime, label))
+    busy = sum(totals.values()) - totals['wait'] or 1.0
+    top.sort(reverse=True)
+    return {'seconds': {k: round(v, 4) for k, v in totals.items()},
+            'share': {k: round(v / busy, 3) for k, v in totals.items() if k != 'wait'},
+            'top': [[label, round(seconds, 4)] for seconds, label in top[:8]]}
+
+
+def profile_pingpong(transport, host, payload, concurrency, duration):
+    """
+    Ping-pong once with both sides under cProfile and split each side's busy
+    time into syscalls / encode_decode / python. Profiling slows Python code
+    more than system calls, so read the shares as relative, not absolute.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        server_profile = os.path.join(tmp, 'server.prof')
+        server = Server(f'{transport}-echo', host, server_profile)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            result = pingpong(transport, host, server.port, payload, concurrency, duration, 0.0)
+            profiler.disable()
+        finally:
+            server.stop()
+        records = []
+        for side, stats in (('client', pstats.Stats(profiler)), ('server', pstats.Stats(server_profile))):
+            records.append({'side': side, 'requests': result['requests'], **categorize(stats)})
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="TCP (EXP1) vs UDP (EXP2) on localhost: RTT, request rate, bulk throughput, profile")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--tests", nargs="+", choices=("pingpong", "bulk", "profile"), default=["pingpong", "bulk"])
+    parser.add_argument("--transports", nargs="+", choices=("tcp", "udp", "udp-reliable"),
+                        default=["tcp", "udp", "udp-reliable"],
+                        help="udp-reliable (EXP2 --reliable) only takes part in bulk")
+    parser.add_argument("--payloads", nargs="+", type=int, default=[64, 1024, 8192], help="bytes")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 16, 64], help="clients / streams")
+    parser.add_argument("--duration", type=float, default=2.0, help="measured seconds per run")
+    parser.add_argument("--warmup", type=float, default=0.5, help="ping-pong seconds not measured")
+    parser.add_argument("--udp-timeout", type=float, default=0.2, help="ping-pong: a UDP reply later than this is lost")
+    parser.add_argument("--out", metavar="PATH", help="append JSON lines to PATH instead of stdout")
+    args = parser.parse_args()
+
+    common = {'host': platform.node(), 'python': platform.python_version(), 'cpus': os.cpu_count(),
+              'time': time.time()}
+    out = open(args.out, "a") if args.out else sys.stdout
+
+    def emit(record):
+        out.write(json.dumps({**record, **common}) + "\n")
+        out.flush()
+
+    try:
+        if "pingpong" in args.tests:
+            for transport in (t for t in args.transports if t in ('tcp', 'udp')):
+                server = Server(f'{transport}-echo', args.host)
+                try:
+                    for payload in args.payloads:
+                        for concurrency in args.concurrency:
+                            result = pingpong(transport, args.host, server.port, payload, concurrency,
+                                              args.duration, args.warmup, args.udp_timeout)
+                            emit({'test': 'pingpong', 'transport': transport, 'payload': payload,
+                                  'concurrency': concurrency, **result})
+                finally:
+                    server.stop()
+        if "bulk" in args.tests:
+            for transport in args.transports:
+                server = Server(f'{transport}-discard' if transport != 'udp-reliable' else transport, args.host)
+                try:
+                    for payload in args.payloads:
+                        for concurrency in args.concurrency if transport != 'udp-reliable' else [1]:
+                            if transport == 'tcp':
+                                result = tcp_bulk(args.host, server.port, payload, concurrency, args.duration)
+                            elif transport == 'udp':
+                                result = udp_bulk(args.host, server.port, payload, concurrency, args.duration)
+                            else:
+                                result = reliable_bulk(args.host, server.port, payload, args.duration)
+                            emit({'test': 'bulk', 'transport': transport, 'payload': payload,
+                                  'concurrency': concurrency, **result})
+                finally:
+                    server.stop()
+        if "profile" in args.tests:
+            for transport in (t for t in args.transports if t in ('tcp', 'udp')):
+                for record in profile_pingpong(transport, args.host, args.payloads[0],
+                                               max(args.concurrency), args.duration):
+                    emit({'test': 'profile', 'transport': transport, 'payload': args.payloads[0],
+                          'concurrency': max(args.concurrency), **record})
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()